@@ -6,9 +6,53 @@
 # Analytics file - contains the algorithm to plan routes and load trucks.
 # =================================================================================================
 
+from array import array
 from data import *
-import copy
+from instrumentation import instruments
+import bisect
+import concurrent.futures
+import heapq
+import itertools
 import math
+import operator
+import os
+import random
+import struct
+import time
+
+# The embedding cache is a binary file holding a header, followed by [x, y, radius, bearing] for each address as
+# doubles, in table order. The header holds a magic string, the hash of the pruned matrix (see
+# DistanceTable.matrix_hash), the flatten method and iterations, the number of addresses, and the summed squared errors
+# and true distances the stress is found from. See Route.save_embedding.
+EMBEDDING_MAGIC = b"TSPEMBED"
+EMBEDDING_HEADER = struct.Struct("8s32s16sIIdd")
+
+# Route held by each worker process of the parallel solver. It is set once per worker by init_worker, so the distances
+# and packages are not sent again with every trial.
+worker_route = None
+
+
+def init_worker(route):
+    global worker_route
+    worker_route = route
+
+
+# Builds and optimizes one trial plan in a worker process. The init vector holds truck id and start time pairs, and
+# the priority method is given by name. Returns the plan as plain data, see Route.summarize_plan, or None if the trial
+# could not load every package.
+def run_trial(init_vector, method_name):
+    trucks = {}
+    for truck in worker_route.trucks:
+        trucks[truck.truckId] = truck
+    init_vector = [[trucks[truck_id], start_time] for truck_id, start_time in init_vector]
+
+    try:
+        plan = worker_route.trial_solution(init_vector, getattr(worker_route, method_name))
+    except ValueError:
+        return None
+    return worker_route.summarize_plan(plan)
+
+
 # Handles route objects, which contain information on a planned route, and the methods to generate
 # the solutions.
 class Route:
@@ -18,6 +62,20 @@ class Route:
         self.trucks = trucks
         self.plan = []  # Used for holding segment objects, which describes the solution.
         self.dFlattened = {}  # Used for holding a 2D distance matrix representation.
+        self.depot_coordinates = {}  # Flattened coordinates relative to each other depot, see depot_flattened.
+        self.flatten_stress = None  # Normalized stress of dFlattened, set by flatten.
+        self.stress_sums = None  # [summed squared errors, summed squared true distances] behind flatten_stress.
+        self.flatten_method = None  # Method and iterations dFlattened was built with, see flatten.
+        self.flatten_iterations = None
+
+        # Local search settings. When enabled, trial_solution improves each sector sequence with improve_sequence, for
+        # up to local_search_passes passes, or local_search_time seconds (None for no limit), per segment.
+        self.local_search = False
+        self.local_search_passes = 20
+        self.local_search_time = None
+
+        for truck in trucks:
+            self.truck_depot(truck)
 
     # Data object for holding solution components. The route must be broken up into one or more segments.
     # Validation of the solution is the responsibility of the caller.
@@ -35,68 +93,58 @@ class Route:
             self.missed_deadlines = 0
             self.length = math.inf
             self.end_time = math.inf
+            self.delivery_times = {}  # Delivery time of each package, by package id, from the last calculation.
+
+            # Time the truck is booked to be back by, set by trial_solution when it schedules the truck's next trip.
+            # Optimizing the address sequence never makes the segment end later than this, or the truck's shift.
+            self.latest_end = math.inf
 
     # Runs through the provided address sequence and computes whether or not all deadlines are met, the
     # segment length, and when the segment is over. If optimize is true, rotates the address sequence list to find
     # the shortest possible route that meets deadlines. If not all deadlines can be met, optimize
     # keeps meets_deadlines as false, and instead returns the route with the lowest number of missed deadlines.
-    # If update_package_status is set to true, then the original package data will be updated.
+    # Delivery times are always recorded in the segment's delivery_times, without touching the packages. If
+    # update_package_status is set to true, then the original package data will be updated as well.
+    @instruments.timed("calculate segment")
     def calculate_segment(self, segment, optimize=False, update_package_status=False):
+        package_list = segment.package_list
 
-        # Check whether to operate on the original package list, or a copy for accounting purposes.
-        if update_package_status:
-            package_list = segment.package_list
-        else:
-            package_list = copy.deepcopy(segment.package_list)
-
-        # Rotates the given address list by a number of items.
-        def rotate_addresses(input_list, amount):
-            list_len = len(input_list)
-
-            # If the list only has one or less in between items, no rotation can be done.
-            if list_len <= 3:
-                return input_list
-
-            # The start and end of the sector is preserved.
-            start = [input_list[0]]
-            end = [input_list[len(input_list) - 1]]
-
-            # Remove the start and end items
-            input_list.remove(start[0])
-            input_list.remove(end[0])
-
-            # Have to map input values to valid list indices.
-            shift = amount % (list_len - 2)
-
-            # Perform the rotation on all elements besides start and end.
-            rotated_list = start + input_list[-shift:] + input_list[:-shift] + end
-            return rotated_list
-
-        # Recursively call calculate with optimize set to false, with a slightly changed parameter each time.
-        # Otherwise directly calculate as is.
+        # Score every rotation of the stops between the start and end of the address sequence, and keep the rotation
+        # with the fewest missed deadlines, then the shortest length. The first rotation wins ties. score_rotations
+        # sums lengths in a different order than calculate_segment, so its scores are only exact up to rounding. The
+        # rotation with the best certain score is found first, and only rotations that could still beat it once
+        # rounding is accounted for are scored again exactly.
         if optimize:
-            shortest_route = math.inf
-            lowest_deadlines_missed = math.inf
-            optimal_address_sequence = None
-            address_sequence_length = len(segment.address_sequence)
-
-            # Repeatedly rotate the address list and find a good sequence.
-            rotations_remaining = address_sequence_length - 2
-            while rotations_remaining > 0:
-
-                # Calculate as is.
-                self.calculate_segment(segment)
-                # print("calculate segment, optimize Rotation, missed deadlines:",
-                # segment.missed_deadlines, "Starting Time: ", segment.start_time)
-                # print(segment.address_sequence)
-                if segment.missed_deadlines <= lowest_deadlines_missed and segment.length < shortest_route:
-                    optimal_address_sequence = segment.address_sequence
-                    lowest_deadlines_missed = segment.missed_deadlines
-                    shortest_route = segment.length
-
-                # Rotate the address sequence for the next run.
-                segment.address_sequence = rotate_addresses(segment.address_sequence, 1)
-                rotations_remaining -= 1
+            address_sequence = segment.address_sequence
+            start = address_sequence[:1]
+            end = address_sequence[-1:]
+            stops = address_sequence[1:-1]
+
+            # Only rotations that end by the time the truck is booked to be back are allowed. The sequence as given,
+            # shift 0, always is, so it is always kept on the shortlist.
+            latest_end = min(segment.latest_end, segment.truck.end_time)
+            lengths, missed, uncertain = self.score_rotations(segment, self.distances.indices(address_sequence))
+            speed = segment.truck.speed
+            allowed = [shift for shift in range(len(lengths))
+                       if shift == 0 or segment.start_time + (lengths[shift] - 1e-6) / speed <= latest_end]
+            certain_best = min(allowed, key=lambda shift: (missed[shift] + uncertain[shift], lengths[shift]))
+            most_missed = missed[certain_best] + uncertain[certain_best]
+            longest = lengths[certain_best] + 1e-6
+            shortlist = [shift for shift in allowed if shift == 0 or missed[shift] < most_missed or
+                         (missed[shift] == most_missed and lengths[shift] <= longest)]
+            rotations = [start + stops[len(stops) - shift:] + stops[:len(stops) - shift] + end for shift in shortlist]
+
+            exact_lengths, end_times, exact_missed = self.evaluate_sequences(
+                segment, [self.distances.indices(rotation) for rotation in rotations])
+            best = 0
+            for i in range(1, len(rotations)):
+                if end_times[i] > latest_end + 1e-9:
+                    continue
+                if exact_missed[i] < exact_missed[best] or (exact_missed[i] == exact_missed[best] and
+                                                            exact_lengths[i] < exact_lengths[best]):
+                    best = i
+            optimal_address_sequence = rotations[best]
+            lowest_deadlines_missed = exact_missed[best]
 
             # If no rotation meets all deadlines, sacrifice efficiency for speed by moving addresses with earlier
             # deadlines up the queue.
@@ -115,12 +163,12 @@ class Route:
                 effective_address_deadline = []
                 start_address = optimal_address_sequence[0]
                 end_address = start_address
-                optimal_address_sequence.remove(start_address)
+                optimal_address_sequence = optimal_address_sequence[1:-1]
 
                 # First, build a list that includes each addresses effective deadline.
                 for address in optimal_address_sequence:
                     effective_deadline = math.inf
-                    for package in package_list.get_package(field=address):
+                    for package in package_list.get_by_address(address):
                         if package.deadline < effective_deadline:
                             effective_deadline = package.deadline
                     effective_address_deadline.append([address, effective_deadline])
@@ -141,6 +189,12 @@ class Route:
             segment.address_sequence = optimal_address_sequence
             self.calculate_segment(segment, optimize=False)
 
+            # Moving addresses up by deadline may end the trip later than the truck is booked to be back, in which
+            # case the best rotation is kept.
+            if segment.end_time > latest_end + 1e-9 and optimal_address_sequence != rotations[best]:
+                segment.address_sequence = rotations[best]
+                self.calculate_segment(segment, optimize=False)
+
             # print("calculate segment, Optimize, final missed deadlines: ", segment.missed_deadlines)
             return
 
@@ -151,23 +205,30 @@ class Route:
             curr_time = segment.start_time
             total_length = 0
             missed_deadlines = 0
+            delivery_times = {}
+
+            # Look up the length of every hop at once, using the address indices.
+            address_indices = self.distances.indices(addresses)
+            trip_lengths = self.distances.dist_many(address_indices[:-1], address_indices[1:])
 
             # Iterate through the address list.
             for i in range(len(addresses) - 1):  # Has to stop at the second-to-last item.
 
                 # Get the distance between the addresses, and update the total route length and the time.
-                trip_length = self.distances.dist(addresses[i], addresses[i + 1])
+                trip_length = trip_lengths[i]
                 total_length += trip_length
                 curr_time += trip_length / speed
 
                 # Update the packages to be delivered at that address.
-                matching_packages = package_list.get_package(field=addresses[i + 1])
+                matching_packages = package_list.get_by_address(addresses[i + 1])
                 if len(matching_packages) <= 0:
                     continue
 
-                # Update each matching package accordingly.
+                # Record the delivery time of each matching package, and check its deadline.
                 for matching_package in matching_packages:
-                    matching_package.delivery_time = curr_time
+                    delivery_times[matching_package.package_id] = curr_time
+                    if update_package_status:
+                        matching_package.delivery_time = curr_time
 
                     # Check if the package deadline was met. If not, set the appropriate variables.
                     if matching_package.deadline < curr_time:
@@ -178,8 +239,142 @@ class Route:
             segment.missed_deadlines = missed_deadlines
             segment.length = total_length
             segment.end_time = curr_time
+            segment.delivery_times = delivery_times
             return
 
+    # Scores many candidate address sequences for a segment in one pass. Each sequence is a list of address indices,
+    # beginning and ending with the hub. Hop lengths are gathered from the distance matrix and accumulated into arrival
+    # times, and each arrival is checked against the deadlines of the segment's packages at that stop. Returns the
+    # lists of lengths, end times and missed deadline counts, in the order of the sequences. The results are the same
+    # as calculate_segment would give, but no address strings or package tables are touched per sequence.
+    def evaluate_sequences(self, segment, sequences):
+        instruments.count("sequences evaluated", len(sequences))
+        instruments.count("distance lookups", sum(len(sequence) - 1 for sequence in sequences))
+        speed = float(segment.truck.speed)
+        matrix = self.distances.matrix
+        address_index = self.distances.address_index
+
+        # Deadlines of the segment's packages, by the index of the address they are delivered to.
+        stop_deadlines = {}
+        for package in segment.package_list.get_package(get_all=True):
+            stop_deadlines.setdefault(address_index[package.address], []).append(package.deadline)
+
+        lengths = []
+        end_times = []
+        missed = []
+        for sequence in sequences:
+            total_length = 0
+            curr_time = segment.start_time
+            missed_deadlines = 0
+            for i, j in zip(sequence[:-1], sequence[1:]):
+                trip_length = matrix[i][j]
+                total_length += trip_length
+                curr_time += trip_length / speed
+                for deadline in stop_deadlines.get(j, ()):
+                    if deadline < curr_time:
+                        missed_deadlines += 1
+            lengths.append(total_length)
+            end_times.append(curr_time)
+            missed.append(missed_deadlines)
+        return lengths, end_times, missed
+
+    # Scores every rotation of the stops in a sequence of address indices, keeping the first and last index in place.
+    # Rotation k moves the last k stops to the front, as in calculate_segment. Returns the lists of lengths, missed
+    # deadline counts and uncertain deadline counts for k = 0 to (number of stops - 1). A deadline is uncertain when
+    # the stop is reached within rounding error of it, so the exact count of missed deadlines lies between the missed
+    # count and the missed count plus the uncertain count.
+    # A rotation splits the stops into two runs, which keep their order, joined by the hop from the last stop to the
+    # first. With prefix sums of the hop lengths along the stops, the length driven before reaching stop i is
+    # offset + prefix[i], with one offset per run, so each rotation's length takes O(1) time. A deadline at stop i is
+    # missed when its slack, the length that may be driven before it minus prefix[i], is below the offset of the run
+    # holding stop i. The slacks of each run are kept in a Fenwick tree, and going from one rotation to the next moves a
+    # single stop between the runs, so the missed deadlines of each rotation take O(log n) time.
+    def score_rotations(self, segment, sequence):
+        matrix = self.distances.matrix
+        speed = float(segment.truck.speed)
+        start = sequence[0]
+        end = sequence[-1]
+        stops = sequence[1:-1]
+        m = len(stops)
+        instruments.count("rotations evaluated", max(m, 1))
+        if m == 0:
+            lengths, end_times, missed = self.evaluate_sequences(segment, [sequence])
+            return lengths, missed, [0]
+
+        # prefix[i] is the length from the first stop to stop i, going through the stops in order.
+        prefix = [0.0] * m
+        for i in range(1, m):
+            prefix[i] = prefix[i - 1] + matrix[stops[i - 1]][stops[i]]
+        wrap = matrix[stops[m - 1]][stops[0]]
+
+        # Deadlines of the segment's packages at each stop, converted into the length the truck may have driven
+        # before that deadline is missed.
+        address_index = self.distances.address_index
+        stop_deadlines = {}
+        for package in segment.package_list.get_package(get_all=True):
+            stop_deadlines.setdefault(address_index[package.address], []).append(
+                (package.deadline - segment.start_time) * speed)
+        stop_slacks = [[limit - prefix[i] for limit in stop_deadlines.get(stops[i], ())] for i in range(m)]
+        end_limits = sorted(stop_deadlines.get(end, ()))
+        tolerance = 1e-6
+
+        # Fenwick trees counting the slacks in each run, indexed by their position among the sorted distinct slacks.
+        slack_values = sorted(set(slack for slacks in stop_slacks for slack in slacks))
+        first_run_tree = [0] * (len(slack_values) + 1)
+        second_run_tree = [0] * (len(slack_values) + 1)
+
+        def add(tree, slack, amount):
+            position = bisect.bisect_left(slack_values, slack) + 1
+            while position < len(tree):
+                tree[position] += amount
+                position += position & -position
+
+        # Number of slacks in the tree whose sorted position is below the given count.
+        def count(tree, position):
+            total = 0
+            while position > 0:
+                total += tree[position]
+                position -= position & -position
+            return total
+
+        # Missed and uncertain deadlines in a run, for the given offset.
+        def count_missed(tree, offset):
+            below = count(tree, bisect.bisect_left(slack_values, offset - tolerance))
+            return below, count(tree, bisect.bisect_right(slack_values, offset + tolerance)) - below
+
+        for slacks in stop_slacks:
+            for slack in slacks:
+                add(second_run_tree, slack, 1)
+
+        # Rotation k visits stop (m - k) % m first. Going from first = m - 1 down to 0 moves one stop at a time from
+        # the second run into the first.
+        lengths = [0.0] * m
+        missed = [0] * m
+        uncertain = [0] * m
+        for first in range(m - 1, -1, -1):
+            for slack in stop_slacks[first]:
+                add(second_run_tree, slack, -1)
+                add(first_run_tree, slack, 1)
+
+            offset_first_run = matrix[start][stops[first]] - prefix[first]
+            if first == 0:
+                length = offset_first_run + prefix[m - 1] + matrix[stops[m - 1]][end]
+                offset_second_run = 0.0
+            else:
+                offset_second_run = offset_first_run + prefix[m - 1] + wrap
+                length = offset_second_run + prefix[first - 1] + matrix[stops[first - 1]][end]
+
+            first_run_missed, first_run_uncertain = count_missed(first_run_tree, offset_first_run)
+            second_run_missed, second_run_uncertain = count_missed(second_run_tree, offset_second_run)
+            end_missed = bisect.bisect_left(end_limits, length - tolerance)
+            end_uncertain = bisect.bisect_right(end_limits, length + tolerance) - end_missed
+
+            shift = (m - first) % m
+            lengths[shift] = length
+            missed[shift] = first_run_missed + second_run_missed + end_missed
+            uncertain[shift] = first_run_uncertain + second_run_uncertain + end_uncertain
+        return lengths, missed, uncertain
+
     # ==========================
     # Prioritization methods.
     # ==========================
@@ -190,13 +385,10 @@ class Route:
         priority = angle
         return priority
 
-    # Prioritize by deadline, then by angle.
+    # Prioritize by deadline, then by angle. The shortest deadline at the address comes from the package table's
+    # address summaries, which are built once and shared by every trial plan.
     def address_priority_deadline_angle(self, input_list):
-        # Find the shortest deadline.
-        deadlines = [24]
-        for item in self.packages.get_package(field=input_list[0]):
-            deadlines.append(item.deadline)
-        deadline = min(deadlines)
+        deadline = self.packages.address_summary(input_list[0]).deadline
         angle = input_list[1]
         priority = deadline + angle / 10
         return priority
@@ -204,17 +396,11 @@ class Route:
     # Prioritize similar to above, except move packages that may only be on a specific truck to the front.
     def address_priority_truck_deadline_angle(self, input_list):
         # Find the shortest deadline, and if there are any truck constraints.
-        deadlines = [24]
-        tied_trucks = False
-        for item in self.packages.get_package(field=input_list[0]):
-            deadlines.append(item.deadline)
-            if item.tiedToTruck != 0:
-                tied_trucks = True
-        deadline = min(deadlines)
+        summary = self.packages.address_summary(input_list[0])
         angle = input_list[1]
-        priority = deadline + angle / 10
+        priority = summary.deadline + angle / 10
 
-        if tied_trucks:
+        if summary.tied_to_truck:
             return priority / 10
         else:
             return priority
@@ -223,33 +409,49 @@ class Route:
     # Solution methods.
     # ==========================
 
-    def iterative_solution(self):
-
-        # Hard coding for now - can always procedurally generate initialization vectors.
-        init_vector1 = [[self.trucks[1], 8], [self.trucks[0], 9 + 5 / 60]]
-        init_vector2 = [[self.trucks[0], 8], [self.trucks[1], 9 + 5 / 60]]
-        init_vector3 = [[self.trucks[1], 8], [self.trucks[0], 8]]
-        init_vector4 = [[self.trucks[0], 9 + 5 / 60], [self.trucks[1], 9 + 5 / 60]]
-        init_vector5 = [[self.trucks[0], 8], [self.trucks[1], 8]]
-        init_vector6 = [[self.trucks[1], 9 + 5 / 60], [self.trucks[0], 9 + 5 / 60]]
-        trial_init_vectors = [init_vector1, init_vector2, init_vector3, init_vector4, init_vector5, init_vector6]
+    # Generates trial plans from every combination of init vector and priority method, and keeps the best. The init
+    # vectors are generated by generate_init_vectors, up to max_vectors of them. If target_length is given, the search
+    # stops as soon as a plan meets every deadline within that length. If workers is greater than one, the trial plans
+    # are built and optimized in that many processes. The same plan is chosen either way.
+    @instruments.timed("solve")
+    def iterative_solution(self, workers=1, max_vectors=64, target_length=None):
         trial_sort_methods = [self.address_priority_angle,
                               self.address_priority_deadline_angle,
                               self.address_priority_truck_deadline_angle]
 
         # Generate a combination of all plans with the above vectors and prioritization methods.
-        plans = []
-        for initVector in trial_init_vectors:
+        trials = []
+        for initVector in itertools.islice(self.generate_init_vectors(), max_vectors):
             for method in trial_sort_methods:
-                plans.append(self.trial_solution(initVector, method))
+                trials.append([initVector, method])
 
-        # Optimize each segment.
-        for plan in plans:
-            for segment in plan:
-                self.calculate_segment(segment, optimize=True)
+        if workers > 1:
+            plans = self.parallel_plans(trials, workers, target_length)
+        else:
+            plans = []
+            for initVector, method in trials:
+                # A trial that cannot load every package, such as when the trucks allowed to carry some of them have
+                # ended their shifts, is dropped.
+                try:
+                    plan = self.trial_solution(initVector, method)
+                except ValueError:
+                    continue
+                plans.append(plan)
+
+                if self.meets_target(plan, target_length):
+                    break
+
+        if len(plans) == 0 and len(self.packages) > 0:
+            raise ValueError("No trial plan could load every package")
 
-        # Once each plan and their segments have been optimized, search for the route with the lowest number
-        # of missed deadlines (hopefully 0), and then by lowest length.
+        # Finally, update the route object with the best found plan, and set the package delivery times.
+        self.plan = self.best_plan(plans)
+        for segment in self.plan:
+            self.calculate_segment(segment, update_package_status=True)
+
+    # Once each plan and their segments have been optimized, search for the route with the lowest number
+    # of missed deadlines (hopefully 0), and then by lowest length.
+    def best_plan(self, plans):
         best_plan = []
         shortest_route = math.inf
         least_missed_deadlines = math.inf
@@ -263,187 +465,589 @@ class Route:
                 missed_deadlines += segment.missed_deadlines
                 route_length += segment.length
 
-            # If the plan has less missed deadlines, and a shorter route, update everything.
-            if missed_deadlines <= least_missed_deadlines and route_length < shortest_route:
+            # If the plan has less missed deadlines, or as many and a shorter route, update everything.
+            if missed_deadlines < least_missed_deadlines or (missed_deadlines == least_missed_deadlines and
+                                                             route_length < shortest_route):
                 best_plan = plan
                 least_missed_deadlines = missed_deadlines
                 shortest_route = route_length
                 # print("iterative solution least missed deadlines:",
                 # least_missed_deadlines, "Route length:", shortest_route)
 
-        # Finally, update the route object with the best found plan, and set the package delivery times.
         # print("Iterative Solution Shortest Route:", shortest_route, "Least missed deadlines:", least_missed_deadlines)
-        self.plan = best_plan
+        return best_plan
+
+    # ==========================
+    # Incremental planning.
+    # ==========================
+
+    # Adds a package after the plan has been made, and re-plans the segments that have not left the hub by the given
+    # time. The package cannot be loaded before that time.
+    def add_package(self, package, time):
+        if package.address not in self.distances.address_index:
+            raise ValueError("Package " + str(package.package_id) + " has an unknown address: " + package.address)
+        if self.packages.get_package(package_id=package.package_id) is not None:
+            raise ValueError("Package " + str(package.package_id) + " is already in the table")
+        package.availability = max(package.availability, time)
+        self.packages.insert(package)
+        self.replan(time)
+
+    # Removes a package that has not left the hub by the given time, and re-plans.
+    def remove_package(self, package_id, time):
+        package = self.pending_package(package_id, time)
+        self.packages.remove(package)
+        self.replan(time)
+
+    # Changes fields of a package that has not left the hub by the given time, such as correcting its address, and
+    # re-plans. Fields are given by name, as on Package. If the street or zip code is changed, the address is rebuilt.
+    def modify_package(self, package_id, time, **fields):
+        self.pending_package(package_id, time)
+        self.packages.update_package(package_id, self.distances.address_index, **fields)
+        self.replan(time)
+
+    # Returns a package, if it is in the table and has not left the hub by the given time.
+    def pending_package(self, package_id, time):
+        package = self.packages.get_package(package_id=package_id)
+        if package is None:
+            raise ValueError("Package " + str(package_id) + " is not in the table")
+        for segment in self.plan:
+            if segment.start_time <= time and segment.package_list.get_package(package_id=package_id) is not None:
+                raise ValueError("Package " + str(package_id) + " left the hub at " + str(segment.start_time))
+        return package
+
+    # Re-plans the packages that have not left the hub by the given time. Segments that have departed are kept. The
+    # rest are rebuilt with one trial plan per priority method, starting each truck when it is back at the hub, or at
+    # the given time, and the best plan is kept. This is much less work than iterative_solution, which builds a trial
+    # plan for every init vector.
+    @instruments.timed("replan")
+    def replan(self, time):
+        departed = [segment for segment in self.plan if segment.start_time <= time]
+        departed_ids = set()
+        for segment in departed:
+            for package in segment.package_list.get_package(get_all=True):
+                departed_ids.add(package.package_id)
+        pending_packages = PackageTable()
+        for package in self.packages.get_package(get_all=True):
+            if package.package_id not in departed_ids:
+                pending_packages.insert(package)
+
+        # Each truck is ready at the given time, at its own start time, or 30 minutes after its last departed segment
+        # returns, whichever is latest.
+        ready_times = {}
+        for truck in self.trucks:
+            ready_times[truck.truckId] = max(time, truck.start_time)
+        for segment in departed:
+            return_time = segment.start_time + segment.length / segment.truck.speed + 30 / 60
+            ready_times[segment.truck.truckId] = max(ready_times[segment.truck.truckId], return_time)
+        init_vector = sorted([[truck, ready_times[truck.truckId]] for truck in self.trucks],
+                             key=operator.itemgetter(1))
+
+        plans = []
+        if len(pending_packages) > 0:
+            for method in [self.address_priority_angle,
+                           self.address_priority_deadline_angle,
+                           self.address_priority_truck_deadline_angle]:
+                try:
+                    plan = self.trial_solution(init_vector, method, pending_packages)
+                except ValueError:
+                    continue
+                plans.append(plan)
+
+            if len(plans) == 0:
+                raise ValueError("No trial plan could load every package")
+
+        self.plan = departed + self.best_plan(plans)
         for segment in self.plan:
             self.calculate_segment(segment, update_package_status=True)
 
+    # Generates init vectors from the fleet and the package availability times. Each truck may start at its own start
+    # time, or at any later time a package becomes available. Every assignment of start times to trucks is generated,
+    # ordered by start time, with trucks that share a start time tried in each order.
+    # Trucks with the same capacity, speed and start time, that no package is tied to, are interchangeable. Vectors that
+    # only swap such trucks are dominated by one another, so only one of them is generated. Vectors are generated
+    # lazily, with the earliest start times first, so the caller can stop after a budget. Assignments and orders are
+    # combined with interleaved_product, and orders are drawn with class_orders, so that a small budget varies every
+    # truck's start time and position rather than only the last ones, and large fleets never list every order.
+    def generate_init_vectors(self):
+        availability_times = set()
+        tied_truck_ids = set()
+        for package in self.packages.get_package(get_all=True):
+            availability_times.add(package.availability)
+            tied_truck_ids.add(package.tiedToTruck)
+
+        # Group the trucks into classes of interchangeable trucks, keeping the order of the fleet.
+        truck_classes = {}
+        for truck in self.trucks:
+            key = (truck.capacity, truck.speed, truck.start_time, self.truck_depot(truck), truck.end_time)
+            if truck.truckId in tied_truck_ids:
+                key += (truck.truckId,)
+            truck_classes.setdefault(key, []).append(truck)
+
+        # For each class, the possible start times, and every way of spreading its trucks over them. The trucks of a
+        # class are interchangeable, so only the number of trucks at each time matters.
+        class_options = []
+        for (capacity, speed, start_time, *_), class_trucks in truck_classes.items():
+            start_times = sorted(time for time in availability_times | {start_time} if time >= start_time)
+            class_options.append([[[truck, time] for truck, time in zip(class_trucks, times)]
+                                  for times in itertools.combinations_with_replacement(start_times, len(class_trucks))])
+
+        for assignment in self.interleaved_product(class_options):
+            # Group the classes by start time. Classes which share a start time are tried in every order.
+            time_groups = {}
+            for class_number, class_assignment in enumerate(assignment):
+                for truck, time in class_assignment:
+                    time_groups.setdefault(time, {}).setdefault(class_number, []).append([truck, time])
+
+            group_orders = []
+            for time in sorted(time_groups):
+                group_orders.append(self.class_orders(list(time_groups[time].values())))
+
+            for order in self.interleaved_product(group_orders):
+                init_vector = []
+                for time_group in order:
+                    for class_group in time_group:
+                        init_vector += class_group
+                yield init_vector
+
+    # Yields orders of the given items, starting with the given order, with no order repeated until every order has
+    # been yielded. Orders after the first are drawn at random, so that every position varies from the start, and are
+    # only drawn as needed, since there are n! of them. The random generator is seeded, so runs are repeatable.
+    def class_orders(self, items):
+        rng = random.Random(len(items))
+        order = list(range(len(items)))
+        seen = {tuple(order)}
+        yield items
+        while len(seen) < math.factorial(len(items)):
+            rng.shuffle(order)
+            if tuple(order) not in seen:
+                seen.add(tuple(order))
+                yield [items[i] for i in order]
+
+    # Yields every combination of one item from each iterable, as a list, like itertools.product, but in order of the
+    # largest position used: first the combination of the first items, then every combination that uses a second item,
+    # and so on. itertools.product varies the last iterable fastest, so its first combinations all share the first
+    # items of the others, while here every iterable varies among the first few. Items are only drawn as needed.
+    def interleaved_product(self, iterables):
+        iterators = [iter(iterable) for iterable in iterables]
+        drawn = [[] for _ in iterators]
+        for depth in itertools.count():
+            for items, iterator in zip(drawn, iterators):
+                if len(items) == depth:
+                    items.extend(itertools.islice(iterator, 1))
+            if all(len(items) <= depth for items in drawn):
+                return
+
+            # The combinations whose largest position is depth, by the first iterable at that position. Iterables
+            # before it are at earlier positions, and those after it at most at depth.
+            for first, items in enumerate(drawn):
+                if len(items) <= depth:
+                    continue
+                positions = ([range(min(depth, len(other))) for other in drawn[:first]] + [[depth]] +
+                             [range(min(depth + 1, len(other))) for other in drawn[first + 1:]])
+                for indices in itertools.product(*positions):
+                    yield [other[i] for other, i in zip(drawn, indices)]
+
+    # Returns whether the plan meets every deadline within the target length. Always false without a target.
+    def meets_target(self, plan, target_length):
+        if target_length is None:
+            return False
+        missed_deadlines = 0
+        route_length = 0
+        for segment in plan:
+            missed_deadlines += segment.missed_deadlines
+            route_length += segment.length
+        return missed_deadlines == 0 and route_length <= target_length
+
+    # Builds and optimizes the trial plans in a pool of worker processes. Each worker receives a copy of the route once,
+    # and returns its plans as plain data, which are rebuilt here around this route's own trucks and packages. Plans
+    # are returned in the same order as the trials. Results are taken in that order too, so when a plan meets the
+    # target, the remaining trials are cancelled and the same plans are returned as in sequential mode.
+    def parallel_plans(self, trials, workers, target_length=None):
+        plans = []
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                                    initargs=(self,)) as executor:
+            futures = []
+            for init_vector, method in trials:
+                init_ids = [[truck.truckId, start_time] for truck, start_time in init_vector]
+                futures.append(executor.submit(run_trial, init_ids, method.__name__))
+
+            for future in futures:
+                summary = future.result()
+                if summary is None:
+                    continue
+                plans.append(self.restore_plan(summary))
+                if self.meets_target(plans[-1], target_length):
+                    for remaining in futures:
+                        remaining.cancel()
+                    break
+
+        return plans
+
+    # Converts a plan into plain data that can be sent between processes. Each segment becomes a list of the truck id,
+    # start time, address sequence, package ids and the results of the last calculation.
+    def summarize_plan(self, plan):
+        summary = []
+        for segment in plan:
+            package_ids = [package.package_id for package in segment.package_list.get_package(get_all=True)]
+            summary.append([segment.truck.truckId, segment.start_time, segment.address_sequence, package_ids,
+                            segment.meets_deadlines, segment.missed_deadlines, segment.length, segment.end_time,
+                            segment.delivery_times])
+        return summary
+
+    # Rebuilds a plan from the output of summarize_plan, using this route's trucks and packages.
+    def restore_plan(self, summary):
+        trucks = {}
+        for truck in self.trucks:
+            trucks[truck.truckId] = truck
+
+        plan = []
+        for item in summary:
+            segment = self.Segment()
+            segment.truck = trucks[item[0]]
+            segment.start_time = item[1]
+            segment.address_sequence = item[2]
+            for package_id in item[3]:
+                segment.package_list.insert(self.packages.get_package(package_id=package_id))
+            segment.meets_deadlines, segment.missed_deadlines, segment.length, segment.end_time = item[4:8]
+            segment.delivery_times = item[8]
+            plan.append(segment)
+        return plan
+
     # Given a set of initial variables, produce a trial solution. Returns a plan list with solution segments.
     # init_vector is a list of truck and starting time pairs
     # which indicates what truck to begin loading and when. address_priority is a function which accepts a list, and
-    # provides a sorting key based off the flattened distance matrix and other constraints.
-    def trial_solution(self, init_vector, address_priority):
+    # provides a sorting key based off the flattened distance matrix and other constraints. packages is the package
+    # table to plan, by default every package in the route.
+    # Trucks are dispatched by a discrete-event scheduler. The events are held in a heap of truck ready times, ordered
+    # by time and then by their order in init_vector. Each segment is optimized with calculate_segment as it is built,
+    # and its truck is ready again 30 minutes after the optimized trip returns. A truck that finds nothing it can load
+    # waits for the next time a group of packages becomes available, which is also how an address correction arrives,
+    # and is retired if there is none. init_vector is not changed.
+    # Each trip must be back at the truck's depot by the end of its shift, and a truck leaves service once it is not.
+    @instruments.timed("trial plan")
+    def trial_solution(self, init_vector, address_priority, packages=None):
+        instruments.count("plans generated")
+        if packages is None:
+            packages = self.packages
 
         # ====================================================
         # Setup: Initialize Variables/Temporary Data structures
         # ====================================================
 
-        # Make a local copy of the master package database. Packages themselves are still passed as references.
-        # Note that copy() will not work due to the individual buckets being objects.
-        local_package_db = PackageTable()
-        for item in self.packages.get_package(get_all=True):
-            local_package_db.insert(item)
-
-        # Generate a list of address-angle pairs, for eventual use in the scanner, which determines which packages to
-        # load onto the truck.
-        prioritized_addresses = []
-        for key, value in self.dFlattened.items():
-            prioritized_addresses.append([key, value[3]])
-
-        # Accept an input function which determines how to prioritize which packages to load.
-        prioritized_addresses.sort(key=address_priority)
+        # Packages are loaded in tied groups, which are found once per package table. Each group gets a bitmask of the
+        # trucks allowed to carry it, with one bit per truck in the fleet, so a stop is eligible for a truck if the
+        # masks of its remaining groups all share the truck's bit.
+        groups, address_groups = packages.tied_groups()
+        truck_bits = {}
+        for truck in self.trucks:
+            truck_bits[truck.truckId] = 1 << len(truck_bits)
+        group_masks = []
+        for group in groups:
+            mask = (1 << len(truck_bits)) - 1
+            for truck_id in group.trucks:
+                mask &= truck_bits.get(truck_id, 0)
+            group_masks.append(mask)
+        loaded = [False] * len(groups)
+        packages_left = len(packages)
+
+        # Package arrivals, the times at which each group becomes available, in time order.
+        arrivals = sorted([group.availability, group_id] for group_id, group in enumerate(groups))
+        arrival_times = [arrival[0] for arrival in arrivals]
+
+        # The event heap. The counter keeps trucks ready at the same time in the order they were scheduled.
+        events = []
+        event_count = itertools.count()
+        for truck, start_time in init_vector:
+            heapq.heappush(events, [start_time, next(event_count), truck])
+
+        # Each address is served from the nearest depot with a truck in service that may carry all of its remaining
+        # packages, and has the capacity to. Trucks leave service when their shift ends, so the depots are assigned
+        # again whenever one does, and a truck only scans the addresses of its own depot. With a single depot, that is
+        # every address.
+        matrix = self.distances.matrix
+        address_index = self.distances.address_index
+        depot_trucks = {}
+        for truck in self.trucks:
+            depot_trucks.setdefault(self.truck_depot(truck), []).append(truck)
+        in_service = 0
+        for truck, start_time in init_vector:
+            in_service |= truck_bits.get(truck.truckId, 0)
+
+        # Generates the depots' lists of address-angle pairs, for use in the scanner, which determines which packages
+        # to load onto the truck. Angles are bearings from the depot. Addresses with nothing left to load, or served
+        # from another depot, are left out.
+        def assign_depots():
+            home_depots = {}
+            for address, group_ids in address_groups.items():
+                group_ids = [group_id for group_id in group_ids if not loaded[group_id]]
+                if len(group_ids) == 0:
+                    continue
+                mask = in_service
+                group_size = 0
+                for group_id in group_ids:
+                    mask &= group_masks[group_id]
+                    group_size += len(groups[group_id].packages)
+                candidates = [depot for depot, trucks in depot_trucks.items()
+                              if any(mask & truck_bits[truck.truckId] and truck.capacity >= group_size
+                                     for truck in trucks)] or list(depot_trucks)
+                address_row = matrix[address_index[address]]
+                home_depots[address] = min(candidates, key=lambda depot: address_row[address_index[depot]])
+
+            depot_addresses = {}
+            for depot in depot_trucks:
+                prioritized_addresses = []
+                for key, value in self.depot_flattened(depot).items():
+                    if home_depots.get(key) == depot:
+                        prioritized_addresses.append([key, value[3]])
+
+                # Accept an input function which determines how to prioritize which packages to load.
+                prioritized_addresses.sort(key=address_priority)
+                depot_addresses[depot] = prioritized_addresses
+            return depot_addresses
+
+        depot_addresses = assign_depots()
+
+        # A truck that could load nothing, with no arrivals left to wait for, idles out of service. Whenever another
+        # truck leaves service, the depots are assigned again with the idle trucks back in service, and they are woken,
+        # since the addresses left by the leaving truck may now be theirs.
+        idle = []
+
+        def leave_service(truck, time):
+            nonlocal in_service, depot_addresses
+            in_service &= ~truck_bits.get(truck.truckId, 0)
+            for idle_truck in idle:
+                in_service |= truck_bits.get(idle_truck.truckId, 0)
+                heapq.heappush(events, [time, next(event_count), idle_truck])
+            idle.clear()
+            depot_addresses = assign_depots()
 
         # Continuously work on generating a solution until there are no more packages.
         plan = []
-        while len(local_package_db.get_package(get_all=True)) > 0:
+        while packages_left > 0:
+            if len(events) == 0:
+                raise ValueError(str(packages_left) + " packages cannot be loaded onto any truck")
 
             # Initialize a new plan and segment object, which will be used to hold solution details.
-            # The first available truck in the list is loaded.
+            # The first available truck is loaded. A truck whose shift has ended leaves service.
             segment = self.Segment()
-            segment.truck = init_vector[0][0]
-            segment.start_time = init_vector[0][1]
-            init_vector.pop(0)
+            segment.start_time, _, segment.truck = heapq.heappop(events)
+            depot = self.truck_depot(segment.truck)
+            truck_bit = truck_bits.get(segment.truck.truckId, 0)
+            if segment.start_time >= segment.truck.end_time:
+                leave_service(segment.truck, segment.start_time)
+                continue
+            load = 0
 
             # ====================================================
             # Stage 1: Loop through addresses, and add packages.
             # ====================================================
 
-            # Search the prioritized address list for packages to load.
-            for item in prioritized_addresses:
-
-                # Get all packages at the address
-                address = item[0]
-                matching_packages = local_package_db.get_package(field=address)
-                meets_constraints = True
-                tied_package_ids = []
-                matching_package_ids = []
-                group_package_ids = []
+            # Search the depot's prioritized address list for packages to load. Each address is checked in time
+            # proportional to the number of groups with a package there. Loaded stops are kept in order, as address,
+            # groups and package count.
+            stops = []
+            for item in depot_addresses[depot]:
 
-                # Do not consider addresses which no longer have a package
-                if len(matching_packages) == 0:
-                    # print(item, "No matching packages!")
+                # Find the groups with packages at the address that are not yet loaded. Do not consider addresses which
+                # no longer have a package.
+                group_ids = [group_id for group_id in address_groups[item[0]] if not loaded[group_id]]
+                if len(group_ids) == 0:
                     continue
 
-                # Find if the package can be loaded, and any tied packages.
-                for package in matching_packages:
-
-                    # Get the matching id. This will be used to load the truck later if all other constraints pass.
-                    matching_package_ids.append(package.package_id)
-
-                    # Check if all matching packages are allowed on the current truck.
-                    if package.tiedToTruck != 0 and package.tiedToTruck != segment.truck.truckId:
-                        meets_constraints = False
-                        # print(item, "Package not allowed on truck!")
-                        break
-
-                    # Check that the package is in the hub at the current starting time.
-                    if package.availability > segment.start_time:
-                        # print(item, "Package not available!")
-                        meets_constraints = False
-                        break
-
-                    # Find all tied package ids.
-                    if len(package.tiedToPackage) != 0:
-                        for tied_package_id in package.tiedToPackage:
-                            tied_package_ids.append(tied_package_id)
-
-                # The list may have duplicates (due to tied packages also being matched packages). Eliminate them.
-                group_package_ids = list(dict.fromkeys(tied_package_ids + matching_package_ids))
-                num_packages_in_group = len(group_package_ids)
-                num_packages_already_on_truck = len(segment.package_list.get_package(get_all=True))
-
-                # Check to see if the group fits on the truck. If the total packages in the group (tied packages and
-                # packages to be delivered to one address) plus packages already on the truck exceed capacity,
-                # the group may not be loaded.
-                if num_packages_in_group + num_packages_already_on_truck > segment.truck.capacity:
-                    # print(item, "Truck full!")
-                    meets_constraints = False
-
-                # If all matching packages do not obey constraints, skip the address.
-                if not meets_constraints:
+                # Every group must be allowed on the current truck, and be in the hub at the current starting time.
+                eligible = truck_bit
+                group_size = 0
+                for group_id in group_ids:
+                    eligible &= group_masks[group_id]
+                    if groups[group_id].availability > segment.start_time:
+                        eligible = 0
+                    group_size += len(groups[group_id].packages)
+
+                # If the groups do not obey constraints, or do not fit on the truck, skip the address.
+                if eligible == 0 or load + group_size > segment.truck.capacity:
                     continue
 
-                # The packages (and all tied packages) may now be added. Packages that are added must also be
-                # removed from the local database.
-
-                for id in group_package_ids:
-                    loaded_package = local_package_db.get_package(package_id=id)
-                    segment.package_list.insert(loaded_package)
-                    local_package_db.remove(loaded_package)
-
-            # print("Packages left:", len(local_package_db.get_package(all=True)), "Truck:", segment.truck.truck_id,
-            #       "Start Time:", segment.start_time)
-            # for item in local_package_db.get_package(all=True):
-            #     print(item)
+                # The packages (and all tied packages) may now be added.
+                for group_id in group_ids:
+                    loaded[group_id] = True
+                    for package in groups[group_id].packages:
+                        segment.package_list.insert(package)
+                stops.append([item[0], group_ids, group_size])
+                load += group_size
+                packages_left -= group_size
 
             # ====================================================
             # Stage 2: Make final checks on the truck inventory.
             # ====================================================
 
             # Find all visited addresses in the loading scheme above.
-            visited_addresses = []
-            for package in segment.package_list.get_package(get_all=True):
-                if package.address in visited_addresses:
-                    pass
+            visited_addresses = list(dict.fromkeys(package.address
+                                                   for package in segment.package_list.get_package(get_all=True)))
+
+            # If nothing could be loaded, the truck waits for the next arrival of packages not yet loaded, and idles if
+            # there is none.
+            if len(visited_addresses) < 1:
+                position = bisect.bisect_right(arrival_times, segment.start_time)
+                while position < len(arrivals) and loaded[arrivals[position][1]]:
+                    position += 1
+                if position < len(arrivals):
+                    heapq.heappush(events, [arrival_times[position], next(event_count), segment.truck])
                 else:
-                    visited_addresses.append(package.address)
-
-            if len(visited_addresses) < 1 and segment.start_time < init_vector[0][1]:
-                init_vector.insert(0, [segment.truck, segment.start_time + 5 / 60])
-                continue
-            elif len(visited_addresses) < 1 and segment.start_time >= init_vector[0][1]:
-                init_vector.append([segment.truck, segment.start_time + 5 / 60])
+                    in_service &= ~truck_bit
+                    idle.append(segment.truck)
+                    depot_addresses = assign_depots()
                 continue
 
-            # print("Visited addresses:", visited_addresses)
-
             # ====================================================
             # Stage 3: Compute the route, add the segment to the
             # plan, and make the truck available again.
             # ====================================================
 
             # Compute the address sequence via the sector method. Extract the r
-            address_routing = self.find_address_sequence(visited_addresses)
-            route_length = address_routing[0]
+            address_routing = self.find_address_sequence(visited_addresses, depot)
+
+            # The truck must be back by the end of its shift. If it would not be, stops are kept in loading order
+            # while the route still returns in time, and the rest are unloaded for later trucks. A truck that cannot
+            # make any of them leaves service.
+            if segment.start_time + address_routing[0] / segment.truck.speed > segment.truck.end_time:
+                kept = []
+                for stop in stops:
+                    routing = self.find_address_sequence([item[0] for item in kept + [stop]], depot)
+                    if segment.start_time + routing[0] / segment.truck.speed <= segment.truck.end_time:
+                        kept.append(stop)
+                        address_routing = routing
+                    else:
+                        for group_id in stop[1]:
+                            loaded[group_id] = False
+                            for package in groups[group_id].packages:
+                                segment.package_list.remove(package)
+                        packages_left += stop[2]
+                if len(kept) == 0:
+                    leave_service(segment.truck, segment.start_time)
+                    continue
+
+            # Addresses with nothing left to load are dropped, so later segments do not scan them.
+            depot_addresses[depot] = [item for item in depot_addresses[depot]
+                                      if not all(loaded[group_id] for group_id in address_groups[item[0]])]
+
             address_sequence = address_routing[1]
 
             # Update the plan address sequence, and then add the segment to the plan.
             segment.address_sequence = address_sequence
+            if self.local_search:
+                self.improve_sequence(segment, self.local_search_passes, self.local_search_time)
             plan.append(segment)
 
-            # Compute how long the route will take, then update the initialization vector, with 5 minutes gap. This
-            # puts the truck back into circulation at the time it returns to the hub.
-            elapsed_time = route_length / segment.truck.speed
-            init_vector.append([segment.truck, segment.start_time + elapsed_time + 30 / 60])
+            # Optimize the segment's sequence, which may choose a longer rotation that misses fewer deadlines. Then
+            # schedule the truck to be ready again, with a 30 minute gap, from the time the final sequence returns to
+            # its depot. The segment is booked to be back by then, so it can never overlap the truck's next trip.
+            self.calculate_segment(segment, optimize=True)
+            segment.latest_end = segment.end_time
+            heapq.heappush(events, [segment.end_time + 30 / 60, next(event_count), segment.truck])
 
         return plan
 
+    # Local search over the segment's address sequence, using 2-opt moves (reversing a run of stops) and Or-opt moves
+    # (moving a run of up to three stops elsewhere). The hub at either end is never moved. The change in length of a
+    # move is found in constant time from the four or six distances it touches. Only moves which shorten the route are
+    # considered, and those are only accepted if they do not add missed deadlines, checked with evaluate_sequences.
+    # Each pass applies the first accepted move found, and the search stops when a pass finds none, after max_passes
+    # passes, or once time_limit seconds have passed. Updates the segment's address sequence and returns its length.
+    @instruments.timed("local search")
+    def improve_sequence(self, segment, max_passes=20, time_limit=None):
+        matrix = self.distances.matrix
+        sequence = self.distances.indices(segment.address_sequence)
+        lengths, end_times, missed = self.evaluate_sequences(segment, [sequence])
+        route_length = lengths[0]
+        missed_deadlines = missed[0]
+        end_search = math.inf if time_limit is None else time.perf_counter() + time_limit
+
+        # Returns the first shorter sequence which does not add missed deadlines, or None.
+        def find_move():
+            n = len(sequence)
+
+            # 2-opt: reverse sequence[i:j + 1].
+            for i in range(1, n - 2):
+                a = sequence[i - 1]
+                b = sequence[i]
+                for j in range(i + 1, n - 1):
+                    c = sequence[j]
+                    d = sequence[j + 1]
+                    delta = matrix[a][c] + matrix[b][d] - matrix[a][b] - matrix[c][d]
+                    if delta < -1e-9:
+                        candidate = sequence[:i] + sequence[j:i - 1:-1] + sequence[j + 1:]
+                        if accept(candidate):
+                            return candidate
+                if time.perf_counter() > end_search:
+                    return None
+
+            # Or-opt: move the run sequence[i:i + run] between sequence[k] and sequence[k + 1].
+            for run in range(1, 4):
+                for i in range(1, n - run):
+                    prev_stop = sequence[i - 1]
+                    first = sequence[i]
+                    last = sequence[i + run - 1]
+                    next_stop = sequence[i + run]
+                    removed = matrix[prev_stop][first] + matrix[last][next_stop] - matrix[prev_stop][next_stop]
+                    for k in range(n - 1):
+                        if i - 1 <= k < i + run:
+                            continue
+                        x = sequence[k]
+                        y = sequence[k + 1]
+                        delta = matrix[x][first] + matrix[last][y] - matrix[x][y] - removed
+                        if delta < -1e-9:
+                            if k < i:
+                                candidate = (sequence[:k + 1] + sequence[i:i + run] + sequence[k + 1:i] +
+                                             sequence[i + run:])
+                            else:
+                                candidate = (sequence[:i] + sequence[i + run:k + 1] + sequence[i:i + run] +
+                                             sequence[k + 1:])
+                            if accept(candidate):
+                                return candidate
+                    if time.perf_counter() > end_search:
+                        return None
+            return None
+
+        # Checks the deadlines of a shorter candidate, and keeps its results if it does not miss more of them.
+        def accept(candidate):
+            nonlocal route_length, missed_deadlines
+            candidate_lengths, candidate_end_times, candidate_missed = self.evaluate_sequences(segment, [candidate])
+            if candidate_missed[0] > missed_deadlines or candidate_lengths[0] >= route_length:
+                return False
+            route_length = candidate_lengths[0]
+            missed_deadlines = candidate_missed[0]
+            return True
+
+        for _ in range(max_passes):
+            candidate = find_move()
+            if candidate is None:
+                break
+            sequence = candidate
+            instruments.count("local search moves")
+
+        segment.address_sequence = [self.distances.address_list[i] for i in sequence]
+        return route_length
+
     # Given a list of addresses to visit, use the flattened distance matrix to generate a sequence. The first and
-    # last address will always be the hub. See documentation.
+    # last address will always be the depot, by default the hub, and the sector is measured from it. See documentation.
 
     # Note to self: the truck loader has to account for how the address sequencing works to ultimately find the
     # best solution. You may need to iteratively invoke this method.
-    def find_address_sequence(self, address_list):
+    def find_address_sequence(self, address_list, depot=None):
+        if depot is None:
+            depot = self.distances.address_list[0]
+        coordinates = self.depot_flattened(depot)
 
         # Create a new flattened distance matrix which only includes items in the address list being evaluated.
         truncated_distance_matrix = {}
         for item in address_list:
-            truncated_distance_matrix[item] = self.dFlattened[item]
+            truncated_distance_matrix[item] = coordinates[item]
 
         # The following dict stores a parametrized length along the perimeter of the circular sector which encloses
         # the provided addresses.
         sector_position = []
 
-        # Closest and furthest addresses to/from hub.
+        # Closest and furthest addresses to/from the depot.
         min_radius_address = min(truncated_distance_matrix, key=lambda k: truncated_distance_matrix[k][2])
         max_radius_address = max(truncated_distance_matrix, key=lambda k: truncated_distance_matrix[k][2])
         min_radius = truncated_distance_matrix[min_radius_address][2]
@@ -507,14 +1111,12 @@ class Route:
         for item in sector_position:
             address_sequence.append(item[0])
 
-        # Add the hub address to the front and back.
-        hub_address = self.distances.address_list[0]
-        address_sequence.insert(0, hub_address)
-        address_sequence.append(hub_address)
+        # Add the depot address to the front and back.
+        address_sequence.insert(0, depot)
+        address_sequence.append(depot)
 
-        route_len = 0
-        for i in range(0, len(address_sequence) - 1):  # Must stop before the last element
-            route_len += self.distances.dist(address_sequence[i], address_sequence[i + 1])
+        address_indices = self.distances.indices(address_sequence)
+        route_len = sum(self.distances.dist_many(address_indices[:-1], address_indices[1:]))
 
         # print(route_len, address_sequence)
         return [route_len, address_sequence]
@@ -522,65 +1124,292 @@ class Route:
     # Takes a distance matrix, and creates a 2D "flattened" representation with x-y coordinates that
     # approximates the otherwise multi-dimensional graph. This allows for geometric solutions to be applied
     # more readily, and for easy visualization. See documentation.
+    # Two methods are available. "sequential" places each address in turn, from the previous address, with the law of
+    # cosines. "mds" places all addresses at once, with classical multidimensional scaling refined by stress
+    # majorization. Either way, the normalized stress of the result is stored in flatten_stress, as a measure of how
+    # well the flattened distances match the distance table (0 is a perfect match).
+    # If a cache file is given, the coordinates are loaded from it when it was built from the same pruned matrix with
+    # the same method, and otherwise computed and written to it. See load_embedding.
+    @instruments.timed("flatten")
+    def flatten(self, method="sequential", iterations=100, cache_str=None):
+        self.flatten_method = method
+        self.flatten_iterations = iterations
+        if cache_str is None or not self.load_embedding(cache_str):
+            self.dFlattened = {}
+            if method == "mds":
+                self.flatten_mds(iterations)
+            else:
+                self.flatten_sequential()
+            self.stress_sums = self.embedding_stress_sums()
+            if cache_str is not None:
+                self.save_embedding(cache_str)
+        self.flatten_stress = self.stress_from_sums()
+        self.depot_coordinates = {}
+
+    # Writes the flattened coordinates to a cache file, keyed by the hash of the pruned matrix. After addresses are
+    # added with add_address, this saves the updated coordinates under the updated table's hash. The file is written
+    # under a temporary name and then renamed, so a reader never sees a partial cache.
+    def save_embedding(self, cache_str):
+        values = array("d")
+        for address in self.distances.address_list:
+            values.extend(self.dFlattened[address])
+
+        temp_str = cache_str + ".tmp"
+        with open(temp_str, "wb") as cache_file:
+            cache_file.write(EMBEDDING_HEADER.pack(EMBEDDING_MAGIC, self.distances.matrix_hash(),
+                                                   self.flatten_method.encode(), self.flatten_iterations,
+                                                   len(self.distances.address_list), *self.stress_sums))
+            values.tofile(cache_file)
+        os.replace(temp_str, cache_str)
+
+    # Loads the flattened coordinates from a cache file. Returns False, leaving the coordinates untouched, if the file
+    # is missing, malformed, or was built from a different pruned matrix or with a different method than flatten was
+    # last called with. Checking the matrix hashes all n^2 distances, which is still far cheaper than flattening.
+    def load_embedding(self, cache_str):
+        n = len(self.distances.address_list)
+        try:
+            with open(cache_str, "rb") as cache_file:
+                header = cache_file.read(EMBEDDING_HEADER.size)
+                if len(header) != EMBEDDING_HEADER.size:
+                    return False
+                magic, matrix_hash, method, iterations, size, error, total = EMBEDDING_HEADER.unpack(header)
+                if (magic != EMBEDDING_MAGIC or method.rstrip(b"\0") != self.flatten_method.encode() or
+                        iterations != self.flatten_iterations or size != n or
+                        matrix_hash != self.distances.matrix_hash()):
+                    return False
+
+                values = array("d")
+                values.fromfile(cache_file, 4 * n)
+        except (OSError, EOFError):
+            return False
+
+        self.dFlattened = {address: values[4 * i:4 * i + 4].tolist()
+                           for i, address in enumerate(self.distances.address_list)}
+        self.stress_sums = [error, total]
+        return True
+
+    # Adds a new delivery address to the distance table, given its direct distances to every address already in it,
+    # in table order, and places it in the flattened coordinates without flattening again. See
+    # DistanceTable.add_address and place_address. Packages for the address may then be added with add_package.
+    def add_address(self, address, direct_distances):
+        self.distances.add_address(address, direct_distances)
+        self.place_address(address)
+
+    # Places one address, already in the distance table, in the flattened coordinates, fitting it against the
+    # coordinates already there without moving them. As in flatten_sequential, its radius is its distance from the hub,
+    # and its bearing is whichever of the two law of cosines solutions, here from its nearest address, has the least
+    # quadratic error against every placed address. For an MDS layout, the point is then refined with the same stress
+    # majorization as flatten_mds, with only the new point moving. The stress is updated to match, and the depot
+    # coordinates are rebuilt on next use. Runs in O(n).
+    def place_address(self, address, iterations=100):
+        address_list = self.distances.address_list
+        row = self.distances.matrix[self.distances.address_index[address]]
+        placed = [[row[j], self.dFlattened[other]] for j, other in enumerate(address_list)
+                  if other != address and other in self.dFlattened]
+
+        r_curr = row[0]
+        bearing = 0
+        others = [[true_dist, value] for true_dist, value in placed if value[2] > 0]
+        if len(others) > 0:
+            d, nearest = min(others, key=lambda item: item[0])
+            candidates = self.find_angle(nearest[2], r_curr, d, nearest[3])
+            bearing = min(candidates, key=lambda angle: sum((true_dist - self.polar_dist(value[2], r_curr, value[3],
+                                                                                          angle)) ** 2
+                                                            for true_dist, value in placed))
+        x = r_curr * math.cos(bearing)
+        y = r_curr * math.sin(bearing)
+
+        if self.flatten_method == "mds" and len(placed) > 0:
+            for _ in range(iterations):
+                sum_x = 0
+                sum_y = 0
+                for true_dist, value in placed:
+                    dx = x - value[0]
+                    dy = y - value[1]
+                    flattened_dist = math.hypot(dx, dy)
+                    ratio = true_dist / flattened_dist if flattened_dist > 0 else 0
+                    sum_x += value[0] + ratio * dx
+                    sum_y += value[1] + ratio * dy
+                new_x = sum_x / len(placed)
+                new_y = sum_y / len(placed)
+                converged = abs(new_x - x) + abs(new_y - y) < 1e-9
+                x = new_x
+                y = new_y
+                if converged:
+                    break
+            r_curr = math.hypot(x, y)
+            bearing = math.atan2(y, x) % (2 * math.pi)
+
+        self.dFlattened[address] = [x, y, r_curr, bearing]
+        if self.stress_sums is not None:
+            for true_dist, value in placed:
+                self.stress_sums[0] += (true_dist - math.hypot(x - value[0], y - value[1])) ** 2
+                self.stress_sums[1] += true_dist ** 2
+            self.flatten_stress = self.stress_from_sums()
+        self.depot_coordinates = {}
+
+    # Returns the depot a truck leaves from, which is the hub unless the truck has its own. The depot is checked here
+    # rather than only when the route is made, since trucks may be changed or added afterwards.
+    def truck_depot(self, truck):
+        if truck.depot is None:
+            return self.distances.address_list[0]
+        if truck.depot not in self.distances.address_index:
+            raise ValueError("Truck " + str(truck.truckId) + " has an unknown depot: " + str(truck.depot))
+        return truck.depot
+
+    # Returns the flattened coordinates relative to a depot, as a dict of address to [x, y, radius, bearing], like
+    # dFlattened, which holds them relative to the hub. As in flatten, radii are the pruned distances from the depot.
+    # Bearings are taken from the flattened positions, with the depot moved to the origin. Computed once per depot.
+    def depot_flattened(self, depot):
+        if depot == self.distances.address_list[0]:
+            return self.dFlattened
+        if depot not in self.depot_coordinates:
+            depot_row = self.distances.matrix[self.distances.address_index[depot]]
+            depot_x, depot_y = self.dFlattened[depot][:2]
+            coordinates = {}
+            for i, address in enumerate(self.distances.address_list):
+                x, y = self.dFlattened[address][:2]
+                bearing = math.atan2(y - depot_y, x - depot_x) % (2 * math.pi)
+                radius = depot_row[i]
+                coordinates[address] = [radius * math.cos(bearing), radius * math.sin(bearing), radius, bearing]
+            self.depot_coordinates[depot] = coordinates
+        return self.depot_coordinates[depot]
 
     # Note to self: this naive method worked surprisingly well. Didn't need to use multi-dimensional Newton-Rahpson.
-    def flatten(self):
-
-        prev_address = self.distances.address_list[
-            0]  # Storing the previous item reference, needed for the calculation process.
-        for currAddress in self.distances.address_list:
-            self.dFlattened[currAddress] = [0,  # Initial x-coordinate
-                                            0,  # Initial y-coordinate
-                                            self.distances.dist(currAddress, self.distances.address_list[0]),
-                                            # Radius (distance from hub)
-                                            0]  # Initial bearing (from hub)
-
-            # For convenience, get the direct reference to the coordinate list for the previous and current address.
-            prev_coordinates = self.dFlattened[prev_address]
-            curr_coordinates = self.dFlattened[currAddress]
-
-            # Acquire the needed function parameters to find the valid angles for item.
-            d = self.distances.dist(prev_address, currAddress)
-            r_prev = prev_coordinates[2]
-            r_curr = curr_coordinates[2]
-            a_prev = prev_coordinates[3]
+    def flatten_sequential(self):
+        matrix = self.distances.matrix
+        angles = [0] * len(matrix)  # Bearing (from hub) of each address, by index.
+
+        for i, currAddress in enumerate(self.distances.address_list):
+            prev = max(i - 1, 0)  # The previous address index, needed for the calculation process.
+
+            # Acquire the needed function parameters to find the valid angles for item. Radii are distances from hub.
+            d = matrix[prev][i]
+            r_prev = matrix[prev][0]
+            r_curr = matrix[i][0]
+            a_prev = angles[prev]
 
             # Compute the two possible angles for the current item.
             a_curr = self.find_angle(r_prev, r_curr, d, a_prev)
 
-            # To find the valid angle, check which one results in the least amount of error with the other points.
-            # Error is weighted quadratically, to penalize outliers. See documentation.
+            # To find the valid angle, check which one results in the least amount of error with the points placed
+            # before it. Error is weighted quadratically, to penalize outliers. See documentation.
             error1 = 0
             error2 = 0
-            for address, val in self.dFlattened.items():
-                # Do not compare against self.
-                if address == currAddress:
-                    break
+            for j in range(i):
                 # Radius and angle for the current item being evaluated.
-                r_val = val[2]
-                a_val = val[3]
+                r_val = matrix[j][0]
+                a_val = angles[j]
 
                 # Flattened distance represents the distance between the two points on the 2D model, which will not
                 # necessarily be equal to the true distance as reported on the table. This error must be found and
                 # computed.
                 flattened_dist1 = self.polar_dist(r_val, r_curr, a_val, a_curr[0])
                 flattened_dist2 = self.polar_dist(r_val, r_curr, a_val, a_curr[1])
-                true_dist = self.distances.dist(address, currAddress)
+                true_dist = matrix[j][i]
                 error1 += (true_dist - flattened_dist1) ** 2
                 error2 += (true_dist - flattened_dist2) ** 2
 
             # Pick the angle that leads to a more accurate model.
             if error1 < error2:
-                self.dFlattened[currAddress][3] = a_curr[0]
+                angles[i] = a_curr[0]
             else:
-                self.dFlattened[currAddress][3] = a_curr[1]
-
-            # Set x and y coordinates respectively
-            self.dFlattened[currAddress][0] = r_curr * math.cos(self.dFlattened[currAddress][3])
-            self.dFlattened[currAddress][1] = r_curr * math.sin(self.dFlattened[currAddress][3])
-
-            # Set previous item to current for the next loop iteration.
-            prev_address = currAddress
+                angles[i] = a_curr[1]
+
+            # Set x and y coordinates, radius and bearing respectively.
+            self.dFlattened[currAddress] = [r_curr * math.cos(angles[i]), r_curr * math.sin(angles[i]), r_curr,
+                                            angles[i]]
+
+    # Places every address at once. Classical multidimensional scaling gives the starting coordinates, from the top two
+    # eigenvectors of the double centered matrix of squared distances, found by power iteration. Stress majorization
+    # (SMACOF) then moves the points to reduce the stress, for up to the given number of iterations, stopping early
+    # once the stress stops improving. Coordinates are shifted so that the hub is at the origin.
+    # Negative eigenvalues, which a table that does not fit any flat plane can produce, are clamped to zero.
+    def flatten_mds(self, iterations=100):
+        matrix = self.distances.matrix
+        n = len(matrix)
+
+        # Double centered squared distances.
+        squared = [[d * d for d in row] for row in matrix]
+        row_means = [sum(row) / n for row in squared]
+        grand_mean = sum(row_means) / n
+        centered = [[-0.5 * (value - mean_i - mean_j + grand_mean) for value, mean_j in zip(row, row_means)]
+                    for row, mean_i in zip(squared, row_means)]
+
+        # Power iteration for the top two eigenvectors, removing the first from the second.
+        axes = []
+        for axis in range(2):
+            vector = [math.sin(i + axis + 1) for i in range(n)]
+            eigenvalue = 0
+            for _ in range(200):
+                product = [sum(map(operator.mul, row, vector)) for row in centered]
+                for other_eigenvalue, other_vector in axes:
+                    overlap = other_eigenvalue * sum(map(operator.mul, other_vector, vector))
+                    product = [value - overlap * other for value, other in zip(product, other_vector)]
+                eigenvalue = sum(map(operator.mul, product, vector))
+                norm = math.sqrt(sum(value * value for value in product))
+                if norm == 0:
+                    break
+                product = [value / norm for value in product]
+                converged = max(abs(new - old) for new, old in zip(product, vector)) < 1e-9
+                vector = product
+                if converged:
+                    break
+            axes.append([eigenvalue, vector])
+        xs = [value * math.sqrt(max(axes[0][0], 0)) for value in axes[0][1]]
+        ys = [value * math.sqrt(max(axes[1][0], 0)) for value in axes[1][1]]
+
+        # Stress majorization. Each iteration replaces every point with the Guttman transform of the current ones, and
+        # measures the stress of the current points on the way.
+        previous_stress = math.inf
+        for _ in range(iterations):
+            new_xs = []
+            new_ys = []
+            stress = 0
+            for i in range(n):
+                dxs = [xs[i] - x for x in xs]
+                dys = [ys[i] - y for y in ys]
+                flattened_dists = list(map(math.hypot, dxs, dys))
+                ratios = [true_dist / flattened_dist if flattened_dist > 0 else 0
+                          for true_dist, flattened_dist in zip(matrix[i], flattened_dists)]
+                stress += sum((true_dist - flattened_dist) ** 2
+                              for true_dist, flattened_dist in zip(matrix[i], flattened_dists))
+                new_xs.append(sum(map(operator.mul, ratios, dxs)) / n)
+                new_ys.append(sum(map(operator.mul, ratios, dys)) / n)
+            if stress >= previous_stress * (1 - 1e-6):
+                break
+            previous_stress = stress
+            xs = new_xs
+            ys = new_ys
+
+        for i, address in enumerate(self.distances.address_list):
+            x = xs[i] - xs[0]
+            y = ys[i] - ys[0]
+            self.dFlattened[address] = [x, y, math.hypot(x, y), math.atan2(y, x) % (2 * math.pi)]
+
+    # Normalized stress of the flattened coordinates, from stress_sums: the root of the summed squared differences
+    # between flattened and true distances, over the root of the summed squared true distances.
+    def stress_from_sums(self):
+        error, total = self.stress_sums
+        if total == 0:
+            return 0.0
+        return math.sqrt(error / total)
+
+    # The summed squared differences between flattened and true distances, and the summed squared true distances, over
+    # every pair of addresses.
+    def embedding_stress_sums(self):
+        matrix = self.distances.matrix
+        points = [self.dFlattened[address] for address in self.distances.address_list]
+        error = 0
+        total = 0
+        for i in range(len(points)):
+            x_i = points[i][0]
+            y_i = points[i][1]
+            for j in range(i):
+                true_dist = matrix[i][j]
+                error += (true_dist - math.hypot(x_i - points[j][0], y_i - points[j][1])) ** 2
+                total += true_dist ** 2
+        return [error, total]
 
     # A basic wrapper around polar_dist, which accepts two addresses as an argument.
     def flattened_dist(self, address1, address2):
@@ -598,7 +1427,8 @@ class Route:
 
     # Polar distance formula.
     def polar_dist(self, r1, r2, a1, a2):
-        return math.sqrt(r1 ** 2 + r2 ** 2 - 2 * r1 * r2 * math.cos(a1 - a2))
+        # Rounding can take the result just below zero when the two points coincide.
+        return math.sqrt(max(r1 ** 2 + r2 ** 2 - 2 * r1 * r2 * math.cos(a1 - a2), 0))
 
     # With known distances from the hub, one known polar angle, and known distance from each other, find the
     # two valid polar angles of the second radius. See documentation.
@@ -607,8 +1437,10 @@ class Route:
             return [0, 0]
 
         # Law of cosines to compute angle between two locations. Absolute angle has two candidates - one in the
-        # clockwise direction, the other counter-clockwise.
-        angle_between = math.acos((d ** 2 - (r1 ** 2 + r2 ** 2)) / (-2 * r1 * r2))
+        # clockwise direction, the other counter-clockwise. If the three distances break the triangle inequality, as
+        # rounded or unpruned tables can, the cosine is clamped, which places the points in a line.
+        cosine = (d ** 2 - (r1 ** 2 + r2 ** 2)) / (-2 * r1 * r2)
+        angle_between = math.acos(min(max(cosine, -1), 1))
         val1 = a1 + angle_between
         val2 = a1 - angle_between
 
@@ -617,34 +1449,82 @@ class Route:
         return [val1 % (2 * math.pi), val2 % (2 * math.pi)]
 
 
+# The times at which one package leaves the hub and is delivered. A package is "Not delivered" up to and including its
+# departure time, "In transit" after it, and "Delivered" from its delivery time on. Packages that are not in the plan
+# never leave the hub.
+class PackageTimeline:
+    __slots__ = ("package", "truck_id", "departure_time", "delivery_time", "event_times")
+
+    statuses = ("Not delivered", "In transit", "Delivered")
+
+    def __init__(self, package, truck_id=0, departure_time=math.inf, delivery_time=math.inf):
+        self.package = package
+        self.truck_id = truck_id
+        self.departure_time = departure_time
+        self.delivery_time = delivery_time
+
+        # The times at which each status after the first begins. Departure is exclusive, so In transit begins at the
+        # next representable time. A package delivered at the hub is only Delivered once it has departed.
+        in_transit = math.nextafter(departure_time, math.inf)
+        self.event_times = (in_transit, max(delivery_time, in_transit))
+
+    def status(self, time):
+        return self.statuses[bisect.bisect_right(self.event_times, time)]
+
+
+# Precomputed delivery timeline of a plan. It is built once, and answers status queries at any time by binary search,
+# without changing the packages, so any number of lookups may be made at different times. It must be rebuilt if the
+# plan changes.
+class Timeline:
+    def __init__(self, plan, packages):
+        self.package_timelines = {}
+        for segment in plan:
+            for package in segment.package_list.get_package(get_all=True):
+                self.package_timelines[package.package_id] = PackageTimeline(
+                    package, segment.truck.truckId, segment.start_time,
+                    segment.delivery_times.get(package.package_id, math.inf))
+        for package in packages.get_package(get_all=True):
+            if package.package_id not in self.package_timelines:
+                self.package_timelines[package.package_id] = PackageTimeline(package)
+
+        # Sorted event times over every package, and the package ids in the same order, for bulk and range queries.
+        self.in_transit_times = sorted(timeline.event_times[0] for timeline in self.package_timelines.values())
+        deliveries = sorted([timeline.event_times[1], package_id]
+                            for package_id, timeline in self.package_timelines.items())
+        self.delivered_times = [delivery[0] for delivery in deliveries]
+        self.delivered_ids = [delivery[1] for delivery in deliveries]
+
+    # Returns the status of a package at a given time.
+    def status(self, package_id, time):
+        return self.package_timelines[package_id].status(time)
+
+    # Returns the number of packages with each status at a given time.
+    def count(self, time):
+        delivered = bisect.bisect_right(self.delivered_times, time)
+        left_hub = bisect.bisect_right(self.in_transit_times, time)
+        return {"Not delivered": len(self.package_timelines) - left_hub,
+                "In transit": left_hub - delivered,
+                "Delivered": delivered}
+
+    # Returns the ids of the packages delivered from start up to and including end, in order of delivery.
+    def delivered_between(self, start, end):
+        return self.delivered_ids[bisect.bisect_left(self.delivered_times, start):
+                                  bisect.bisect_right(self.delivered_times, end)]
+
+
 # Evaluates route solutions, and produces the desired output.
 class Report:
     def __init__(self, route):
         self.route = route
+        self.timeline = Timeline(route.plan, route.packages)
 
-    # Sets all relevant delivery statuses at a given moment.
+    # Returns every package, ordered by id, with its delivery status at a given moment.
     def simulate(self, time):
-
-        for segment in self.route.plan:
-
-            # Update the delivery statuses of each package.
-            for package in segment.package_list.get_package(get_all=True):
-                if segment.start_time >= time:  # Status remains "Not delivered" if the time is before segment start.
-                    continue
-                else:
-                    package.status = "In transit"
-                if time >= package.delivery_time:
-                    package.status = "Delivered"
-
-    # Resets all statuses, to clean up after simulate.
-    def reset(self):
-        # Sets all package statuses in the route to 0, or undelivered.
-        for item in self.route.packages.get_package(get_all=True):
-            item.status = "Not delivered"
-        # Clears all package lists from the trucks and resets the miles.
-        for item in self.route.trucks:
-            item.packages = None
-            item.miles = 0
+        package_statuses = []
+        for package_id in sorted(self.timeline.package_timelines):
+            timeline = self.timeline.package_timelines[package_id]
+            package_statuses.append([timeline.package, timeline.status(time)])
+        return package_statuses
 
     # Print the routing solution.
     def print_solution(self):
@@ -663,7 +1543,8 @@ class Report:
             for address in segment.address_sequence:
                 print(address)
 
-    def out(self):
+    # Print the route length, and every package with its delivery status at a given moment.
+    def out(self, time):
 
         route_length = 0;
         for segment in self.route.plan:
@@ -671,11 +1552,5 @@ class Report:
 
         print("\nRoute Length:", route_length)
 
-        def get_id(package):
-            return package.package_id
-
-        sorted_by_id = self.route.packages.get_package(get_all=True)
-        sorted_by_id.sort(key=get_id)
-
-        for item in sorted_by_id:
-            print(item)
+        for package, status in self.simulate(time):
+            print(package.describe(status, self.timeline.package_timelines[package.package_id].delivery_time))
@@ -0,0 +1,1134 @@
+# =================================================================================================
+# Benchmark file - times the expensive stages of the program against synthetic data of varying size.
+# Run with: python benchmark.py
+# =================================================================================================
+
+import argparse
+import copy
+import itertools
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from analytics import *
+
+
+# ==========================
+# Synthetic data generators.
+# ==========================
+
+# Writes a synthetic distance table to a CSV file, in the same lower-triangular format as distances.csv. Addresses are
+# random points on a plane, and the distance between two of them is the straight line distance plus some noise. A
+# detour_rate share of the roads are made artificially long, so the table is not metric and pruning has detours to find.
+def generate_distance_csv(filename, num_addresses, seed=0, detour_rate=0.1):
+    rng = random.Random(seed)
+    points = [(rng.uniform(0, 10), rng.uniform(0, 10)) for _ in range(num_addresses)]
+
+    with open(filename, "w") as csv_file:
+        for i in range(num_addresses):
+            if i == 0:
+                row = ["HUB"]
+            else:
+                row = ["Address " + str(i) + " (" + str(84000 + i) + ")"]
+
+            for j in range(i):
+                trip_length = math.dist(points[i], points[j]) * rng.uniform(1, 1.3) + 0.1
+                if rng.random() < detour_rate:
+                    trip_length *= 2
+                row.append(str(round(trip_length, 1)))
+            row.append("0")
+
+            # Pad out the upper triangle with empty cells, like the provided file.
+            row += [""] * (num_addresses - i - 1)
+            csv_file.write(",".join(row) + "\n")
+
+
+# Generates a list of synthetic packages, spread randomly over the given addresses. Addresses must be in the
+# "street (zip)" format used by the distance table.
+def generate_packages(num_packages, addresses, seed=0):
+    rng = random.Random(seed)
+    package_list = []
+    for package_id in range(1, num_packages + 1):
+        address = rng.choice(addresses)
+        street, zip_code = address[:-8], address[-6:-1]
+        deadline = rng.choice([9, 10.5, 24])
+        package_list.append(Package(package_id, street, "Salt Lake City", "UT", zip_code, deadline,
+                                    rng.randint(1, 50), ""))
+    return package_list
+
+
+# Generates a manifest of synthetic packages with the kinds of constraints in the sample data, for a fleet of the given
+# number of trucks. About one package in ten arrives late, at 9:05 or at 10:20. One address in twenty only takes
+# packages on a random truck, since the loader delivers every package at an address together. Every 25th package at the
+# other addresses starts a group of three tied packages.
+def generate_manifest(num_packages, addresses, trucks, seed=0):
+    rng = random.Random(seed)
+    address_trucks = {}
+    for address in addresses:
+        if rng.random() < 0.05:
+            address_trucks[address] = rng.randint(1, trucks)
+
+    package_list = generate_packages(num_packages, addresses, seed)
+    for package in package_list:
+        if rng.random() < 0.1:
+            package.availability = rng.choice([9 + 5 / 60, 10 + 20 / 60])
+        package.tiedToTruck = address_trucks.get(package.address, 0)
+
+    untied = [package for package in package_list if package.tiedToTruck == 0]
+    for start in range(0, len(untied) - 2, 25):
+        group = untied[start:start + 3]
+        for package in group:
+            package.tiedToPackage = [item.package_id for item in group]
+    return package_list
+
+
+# ==========================
+# Reference implementations.
+# ==========================
+
+# The original CSV reader, which reads the whole file with readlines and splits each line on commas. Quoted commas are
+# not handled, and the last field keeps its line ending.
+def legacy_read_csv(filename):
+    my_file = open(filename)
+    temp_list = my_file.readlines()
+    parsed_list = []
+    for line in temp_list:
+        parsed_list.append(line.split(','))
+    my_file.close()
+    return parsed_list
+
+
+# The original loader, which looks up both address indices inside the double loop over address pairs, and then deep
+# copies the resulting dict. Returns the pruned (copied) dict of [distance, [address1, address2]] pairs.
+def legacy_populate(input_str):
+    distance_import = legacy_read_csv(input_str)
+    address_list = []
+    distance_matrix = {}
+    for item in distance_import:
+        address_list.append(item[0])
+
+    for item1 in address_list:
+        for item2 in address_list:
+            if item1 > item2:
+                combined_key = item1 + item2
+                distance_matrix[combined_key] = [None, [item1, item2]]
+            else:
+                combined_key = item2 + item1
+                distance_matrix[combined_key] = [None, [item2, item1]]
+
+            ind1 = address_list.index(item1)
+            ind2 = address_list.index(item2)
+            if ind1 > ind2:
+                distance_matrix[combined_key][0] = float(distance_import[ind1][ind2 + 1])
+            else:
+                distance_matrix[combined_key][0] = float(distance_import[ind2][ind1 + 1])
+
+    return copy.deepcopy(distance_matrix)
+
+
+# The original package class, which keeps its attributes in a per-instance dict and a separate copy of every string.
+class LegacyPackage:
+    def __init__(self, package_id, street, city, state, zip_code, deadline, weight, special_note):
+        self.package_id = int(package_id)
+        self.street = street
+        self.city = city
+        self.state = state
+        self.zip_code = zip_code
+        self.address = str(street) + " (" + str(zip_code) + ")"
+        self.weight = int(weight)
+        self.specialNote = special_note
+        self.availability = 0
+        self.deadline = float(deadline)
+        self.tiedToPackage = []
+        self.tiedToTruck = 0
+        self.status = "Not delivered"
+        self.delivery_time = math.inf
+
+
+# The original pruner, which enumerates every candidate route for each address pair. Kept only as a baseline to
+# compare against; the work grows exponentially with the number of addresses. Returns a dict of address pairs with
+# the same [length, route] values that DistanceTable.prune produces.
+def legacy_prune(distances):
+    pruned = {}
+    for address1 in distances.address_list:
+        for address2 in distances.address_list:
+            if address1 > address2:
+                pruned[address1 + address2] = [distances.dist(address1, address2, search_pruned=False),
+                                               [address1, address2]]
+
+    for item in pruned.values():
+        path_len = item[0]
+        route = item[1]
+        candidate_routes = [[0, item[1][0]]]
+        incomplete_routes = True
+
+        while incomplete_routes:
+            complete_routes = 0
+            temp_list = copy.copy(candidate_routes)
+
+            for trialRoute in temp_list:
+                if trialRoute[len(trialRoute) - 1] == route[len(route) - 1]:
+                    complete_routes += 1
+                    if complete_routes >= len(temp_list):
+                        incomplete_routes = False
+                    if trialRoute[0] > path_len + .001:
+                        candidate_routes.remove(trialRoute)
+                    elif trialRoute[0] < path_len + .001:
+                        path_len = trialRoute[0]
+                    continue
+
+                new_addresses = copy.copy(distances.address_list)
+                temp_trial_route_list = copy.copy(trialRoute)
+                temp_trial_route_list.pop(0)
+                for visitedAddress in temp_trial_route_list:
+                    new_addresses.remove(visitedAddress)
+
+                for address in new_addresses:
+                    new_route = copy.copy(trialRoute)
+                    trial_segment = float(distances.dist(trialRoute[len(trialRoute) - 1], address,
+                                                         search_pruned=False))
+                    new_route[0] += trial_segment
+                    new_route.append(address)
+                    if new_route[0] < path_len + .001:
+                        candidate_routes.append(new_route)
+
+                candidate_routes.remove(trialRoute)
+
+        item[0] = round(candidate_routes[0][0], 1)
+        candidate_routes[0].pop(0)
+        item[1] = candidate_routes[0]
+    return pruned
+
+
+# ==========================
+# Benchmarks.
+# ==========================
+
+# Times DistanceTable.populate against the legacy loader for each table size. The legacy loader is only run up to
+# legacy_limit addresses. Where both run, every direct distance is checked to be identical.
+def benchmark_populate(sizes, legacy_limit=25, seed=0):
+    print("\npopulate")
+    print("{:>10} {:>14} {:>14}".format("addresses", "populate (s)", "legacy (s)"))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size in sizes:
+            filename = os.path.join(temp_dir, "distances_" + str(size) + ".csv")
+            generate_distance_csv(filename, size, seed)
+
+            distances = DistanceTable()
+            start = time.perf_counter()
+            distances.populate(filename)
+            populate_time = time.perf_counter() - start
+
+            legacy_time = "skipped"
+            if size <= legacy_limit:
+                start = time.perf_counter()
+                legacy = legacy_populate(filename)
+                legacy_time = "{:.4f}".format(time.perf_counter() - start)
+
+                for item in legacy.values():
+                    if distances.dist(item[1][0], item[1][1], search_pruned=False) != item[0]:
+                        raise ValueError("Distance mismatch for " + item[1][0] + " to " + item[1][1])
+
+            print("{:>10} {:>14.4f} {:>14}".format(size, populate_time, legacy_time))
+
+
+# Times DistanceTable.prune against the legacy pruner for each table size. The legacy pruner is only run up to
+# legacy_limit addresses, as it does not finish in reasonable time beyond that. Where both run, the pruned distances
+# are checked to never be longer than the legacy ones. The legacy pruner keeps the first surviving candidate rather than
+# the best one, so it occasionally misses a shorter detour; those pairs are counted as improved.
+def benchmark_prune(sizes, legacy_limit=25, seed=0):
+    print("\nprune")
+    print("{:>10} {:>14} {:>14} {:>10}".format("addresses", "prune (s)", "legacy (s)", "improved"))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size in sizes:
+            filename = os.path.join(temp_dir, "distances_" + str(size) + ".csv")
+            generate_distance_csv(filename, size, seed)
+
+            distances = DistanceTable()
+            distances.populate(filename)
+            start = time.perf_counter()
+            distances.prune()
+            prune_time = time.perf_counter() - start
+
+            legacy_time = "skipped"
+            improved = "-"
+            if size <= legacy_limit:
+                start = time.perf_counter()
+                legacy = legacy_prune(distances)
+                legacy_time = "{:.4f}".format(time.perf_counter() - start)
+
+                improved = 0
+                for item in legacy.values():
+                    pruned_len = distances.dist(item[1][0], item[1][-1])
+                    if pruned_len > item[0]:
+                        raise ValueError("Pruned distance is longer for " + item[1][0] + " to " + item[1][-1])
+                    elif pruned_len < item[0]:
+                        improved += 1
+
+            print("{:>10} {:>14.4f} {:>14} {:>10}".format(size, prune_time, legacy_time, improved))
+
+
+# Times loading a pruned table from the prune cache against pruning it, for each table size. The loaded table is checked
+# to match the pruned one, and the cache is checked to be rejected once the CSV file changes.
+def benchmark_cache(sizes, seed=0):
+    print("\ncache")
+    print("{:>10} {:>14} {:>14}".format("addresses", "prune (s)", "load (s)"))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size in sizes:
+            filename = os.path.join(temp_dir, "distances_" + str(size) + ".csv")
+            cache_filename = os.path.join(temp_dir, "distances_" + str(size) + ".cache")
+            generate_distance_csv(filename, size, seed)
+
+            distances = DistanceTable()
+            distances.populate(filename)
+            start = time.perf_counter()
+            distances.prune(cache_filename)
+            prune_time = time.perf_counter() - start
+
+            cached = DistanceTable()
+            cached.populate(filename)
+            start = time.perf_counter()
+            if not cached.load_cache(cache_filename):
+                raise ValueError("Cache was not loaded for " + str(size) + " addresses")
+            load_time = time.perf_counter() - start
+
+            if cached.matrix != distances.matrix or cached.predecessor != distances.predecessor:
+                raise ValueError("Cached table does not match the pruned table for " + str(size) + " addresses")
+
+            generate_distance_csv(filename, size, seed + 1)
+            cached.populate(filename)
+            if cached.load_cache(cache_filename):
+                raise ValueError("Stale cache was loaded for " + str(size) + " addresses")
+
+            print("{:>10} {:>14.4f} {:>14.4f}".format(size, prune_time, load_time))
+
+
+# Times looking up the packages at every address through the address index, against the full scan done by
+# get_package(field=...). The scan is only run up to scan_limit packages. Where both run, the results are checked to
+# contain the same packages.
+def benchmark_package_lookup(sizes, scan_limit=2000, seed=0):
+    print("\npackage lookup")
+    print("{:>10} {:>14} {:>14} {:>14}".format("packages", "insert (s)", "index (s)", "scan (s)"))
+    for size in sizes:
+        addresses = ["Address " + str(i) + " (" + str(84000 + i) + ")" for i in range(1, size // 4 + 2)]
+        package_list = generate_packages(size, addresses, seed)
+
+        packages = PackageTable()
+        start = time.perf_counter()
+        for package in package_list:
+            packages.insert(package)
+        insert_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        indexed = [packages.get_by_address(address) for address in addresses]
+        index_time = time.perf_counter() - start
+
+        scan_time = "skipped"
+        if size <= scan_limit:
+            start = time.perf_counter()
+            scanned = [packages.get_package(field=address) for address in addresses]
+            scan_time = "{:.4f}".format(time.perf_counter() - start)
+
+            for address, index_list, scan_list in zip(addresses, indexed, scanned):
+                if sorted(item.package_id for item in index_list) != sorted(item.package_id for item in scan_list):
+                    raise ValueError("Package mismatch for " + address)
+
+        print("{:>10} {:>14.4f} {:>14.4f} {:>14}".format(size, insert_time, index_time, scan_time))
+
+
+# Measures the memory held by a manifest of packages built with the given class, and the time taken to scan it for the
+# packages at one address. Rows are CSV lines, split as legacy_read_csv does, so that each package gets its own strings.
+def measure_packages(package_class, rows):
+    tracemalloc.start()
+    package_list = [package_class(*row.split(",")) for row in rows]
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    address = package_list[0].address
+    start = time.perf_counter()
+    matches = [item for item in package_list if item.address == address]
+    scan_time = time.perf_counter() - start
+    return memory, scan_time, len(matches)
+
+
+# Compares the memory use and scan speed of Package against the original dict based class, for each manifest size.
+def benchmark_package_memory(sizes, seed=0):
+    print("\npackage memory")
+    print("{:>10} {:>14} {:>14} {:>14} {:>14}".format("packages", "memory (MB)", "legacy (MB)", "scan (s)",
+                                                      "legacy (s)"))
+    for size in sizes:
+        addresses = ["Address " + str(i) + " (" + str(84000 + i) + ")" for i in range(1, size // 4 + 2)]
+        rows = [",".join(str(field) for field in [item.package_id, item.street, item.city, item.state, item.zip_code,
+                                                  item.deadline, item.weight, item.specialNote])
+                for item in generate_packages(size, addresses, seed)]
+
+        memory, scan_time, matches = measure_packages(Package, rows)
+        legacy_memory, legacy_scan_time, legacy_matches = measure_packages(LegacyPackage, rows)
+        if matches != legacy_matches:
+            raise ValueError("Scan mismatch for " + str(size) + " packages")
+
+        print("{:>10} {:>14.2f} {:>14.2f} {:>14.4f} {:>14.4f}".format(size, memory / 2 ** 20, legacy_memory / 2 ** 20,
+                                                                      scan_time, legacy_scan_time))
+
+
+# Times sorting every address with the deadline priority key, reading the cached address summaries, against
+# collecting the packages at each address for every key call as the router used to. Both must give the same order.
+def benchmark_priority(sizes, repeats=18, seed=0):
+    print("\npriority")
+    print("{:>10} {:>14} {:>14} {:>14}".format("packages", "sorts", "summary (s)", "lookup (s)"))
+    rng = random.Random(seed)
+    for size in sizes:
+        addresses = ["Address " + str(i) + " (" + str(84000 + i) + ")" for i in range(1, size // 4 + 2)]
+        packages = PackageTable()
+        for package in generate_packages(size, addresses, seed):
+            packages.insert(package)
+        angles = [[address, rng.uniform(0, 2 * math.pi)] for address in addresses]
+
+        def lookup_priority(input_list):
+            deadlines = [24]
+            for item in packages.get_by_address(input_list[0]):
+                deadlines.append(item.deadline)
+            return min(deadlines) + input_list[1] / 10
+
+        route = Route(DistanceTable(), packages, [])
+        start = time.perf_counter()
+        for _ in range(repeats):
+            summary_order = sorted(angles, key=route.address_priority_deadline_angle)
+        summary_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            lookup_order = sorted(angles, key=lookup_priority)
+        lookup_time = time.perf_counter() - start
+
+        if summary_order != lookup_order:
+            raise ValueError("Priority order mismatch for " + str(size) + " packages")
+        print("{:>10} {:>14} {:>14.4f} {:>14.4f}".format(size, repeats, summary_time, lookup_time))
+
+
+# Times scoring every rotation of one segment holding all addresses, with evaluate_sequences against calling
+# calculate_segment for each rotation, and checks that both give the same results.
+def benchmark_evaluate(sizes, seed=0):
+    print("\nevaluate")
+    print("{:>10} {:>14} {:>14} {:>14}".format("stops", "sequences", "batch (s)", "segment (s)"))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size in sizes:
+            filename = os.path.join(temp_dir, "distances_" + str(size) + ".csv")
+            generate_distance_csv(filename, size + 1, seed)
+            distances = DistanceTable()
+            distances.populate(filename)
+            distances.prune()
+
+            hub = distances.address_list[0]
+            stops = distances.address_list[1:]
+            route = Route(distances, PackageTable(), [Truck(1)])
+            segment = route.Segment()
+            segment.truck = route.trucks[0]
+            segment.start_time = 8
+            for package in generate_packages(size * 2, stops, seed):
+                segment.package_list.insert(package)
+            sequences = [[hub] + stops[-shift:] + stops[:-shift] + [hub] for shift in range(size)]
+
+            start = time.perf_counter()
+            results = route.evaluate_sequences(segment, [distances.indices(sequence) for sequence in sequences])
+            batch_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for i, sequence in enumerate(sequences):
+                segment.address_sequence = sequence
+                route.calculate_segment(segment)
+                if [segment.length, segment.end_time, segment.missed_deadlines] != [item[i] for item in results]:
+                    raise ValueError("Batch evaluation mismatch for " + str(size) + " stops")
+            segment_time = time.perf_counter() - start
+
+            print("{:>10} {:>14} {:>14.4f} {:>14.4f}".format(size, len(sequences), batch_time, segment_time))
+
+
+# Times choosing the best rotation of one segment holding all addresses, with the prefix sum scoring of
+# calculate_segment(optimize=True) against scoring every rotation exactly with evaluate_sequences. Deadlines are spread
+# over the morning, so that the rotations differ in missed deadlines. Both must choose the same rotation.
+def benchmark_rotations(sizes, seed=0):
+    print("\nrotations")
+    print("{:>10} {:>14} {:>14}".format("stops", "prefix (s)", "exact (s)"))
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size in sizes:
+            filename = os.path.join(temp_dir, "distances_" + str(size) + ".csv")
+            generate_distance_csv(filename, size + 1, seed)
+            distances = DistanceTable()
+            distances.populate(filename)
+            distances.prune()
+
+            hub = distances.address_list[0]
+            stops = distances.address_list[1:]
+            route = Route(distances, PackageTable(), [Truck(1)])
+            segment = route.Segment()
+            segment.truck = route.trucks[0]
+            segment.start_time = 8
+            for package in generate_packages(size * 2, stops, seed):
+                package.deadline = rng.choice([9, 10.5, 12, 23.99])
+                segment.package_list.insert(package)
+            sequence = [hub] + stops + [hub]
+
+            start = time.perf_counter()
+            rotations = [[hub] + stops[size - shift:] + stops[:size - shift] + [hub] for shift in range(size)]
+            lengths, end_times, missed = route.evaluate_sequences(
+                segment, [distances.indices(rotation) for rotation in rotations])
+            best = 0
+            for i in range(1, size):
+                if missed[i] < missed[best] or (missed[i] == missed[best] and lengths[i] < lengths[best]):
+                    best = i
+            exact_time = time.perf_counter() - start
+
+            segment.address_sequence = sequence
+            start = time.perf_counter()
+            route.calculate_segment(segment, optimize=True)
+            prefix_time = time.perf_counter() - start
+
+            if missed[best] == 0 and segment.address_sequence != rotations[best]:
+                raise ValueError("Rotation mismatch for " + str(size) + " stops")
+
+            print("{:>10} {:>14.4f} {:>14.4f}".format(size, prefix_time, exact_time))
+
+
+# Times improve_sequence on one segment holding all addresses, starting from a random order, and reports the route
+# length before and after. The segment carries no packages, so only the length is optimized.
+def benchmark_local_search(sizes, passes=1000, seed=0):
+    print("\nlocal search")
+    print("{:>10} {:>14} {:>14} {:>14}".format("stops", "search (s)", "before", "after"))
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size in sizes:
+            filename = os.path.join(temp_dir, "distances_" + str(size) + ".csv")
+            generate_distance_csv(filename, size + 1, seed)
+            distances = DistanceTable()
+            distances.populate(filename)
+            distances.prune()
+
+            route = Route(distances, PackageTable(), [Truck(1)])
+            segment = route.Segment()
+            segment.truck = route.trucks[0]
+            segment.start_time = 8
+            stops = distances.address_list[1:]
+            rng.shuffle(stops)
+            segment.address_sequence = [distances.address_list[0]] + stops + [distances.address_list[0]]
+            route.calculate_segment(segment)
+            before = segment.length
+
+            start = time.perf_counter()
+            after = route.improve_sequence(segment, passes)
+            search_time = time.perf_counter() - start
+
+            print("{:>10} {:>14.4f} {:>14.1f} {:>14.1f}".format(size, search_time, before, after))
+
+
+# Times flattening a synthetic table with the sequential polar layout and with the MDS layout, and reports the
+# normalized stress of each embedding against the pruned distances.
+def benchmark_flatten(sizes, iterations=30, seed=0):
+    print("\nflatten")
+    print("{:>10} {:>14} {:>14} {:>14} {:>14}".format("addresses", "sequential (s)", "stress", "mds (s)", "stress"))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size in sizes:
+            filename = os.path.join(temp_dir, "distances_" + str(size) + ".csv")
+            generate_distance_csv(filename, size, seed)
+            distances = DistanceTable()
+            distances.populate(filename)
+            distances.prune()
+            route = Route(distances, PackageTable(), [])
+
+            row = [size]
+            for method in ["sequential", "mds"]:
+                start = time.perf_counter()
+                route.flatten(method, iterations)
+                row += [time.perf_counter() - start, route.flatten_stress]
+            print("{:>10} {:>14.4f} {:>14.4f} {:>14.4f} {:>14.4f}".format(*row))
+
+
+# Times reading synthetic distance tables and package manifests with the csv module based reader, against the original
+# split based reader, and reports the throughput of each. Both must give the same fields, apart from the line endings
+# the original reader leaves on the last field.
+def benchmark_csv(sizes, package_sizes, seed=0):
+    print("\ncsv")
+    print("{:>10} {:>10} {:>14} {:>14} {:>14} {:>14}".format("file", "rows", "size (MB)", "csv (MB/s)",
+                                                          "legacy (MB/s)", "typed (MB/s)"))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        files = []
+        for size in sizes:
+            filename = os.path.join(temp_dir, "distances_" + str(size) + ".csv")
+            generate_distance_csv(filename, size, seed)
+            files.append(["distances", size, filename])
+        for size in package_sizes:
+            filename = os.path.join(temp_dir, "packages_" + str(size) + ".csv")
+            addresses = ["Address " + str(i) + " (" + str(84000 + i) + ")" for i in range(1, size // 4 + 2)]
+            with open(filename, "w") as csv_file:
+                for item in generate_packages(size, addresses, seed):
+                    csv_file.write(",".join(str(field) for field in [item.package_id, item.street, item.city,
+                                                                     item.state, item.zip_code, item.deadline,
+                                                                     item.weight, item.specialNote]) + "\n")
+            files.append(["packages", size, filename])
+
+        for kind, size, filename in files:
+            megabytes = os.path.getsize(filename) / 2 ** 20
+
+            start = time.perf_counter()
+            rows = read_csv(filename)
+            csv_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            legacy_rows = legacy_read_csv(filename)
+            legacy_time = time.perf_counter() - start
+
+            if rows != [row[:-1] + [row[-1].rstrip("\n")] for row in legacy_rows]:
+                raise ValueError("CSV mismatch for " + filename)
+
+            # Reading into typed objects: a pruned-ready DistanceTable, or Package objects.
+            start = time.perf_counter()
+            if kind == "distances":
+                DistanceTable().populate(filename)
+            else:
+                for _ in iter_packages(filename):
+                    pass
+            typed_time = time.perf_counter() - start
+
+            print("{:>10} {:>10} {:>14.2f} {:>14.1f} {:>14.1f} {:>14.1f}".format(
+                kind, size, megabytes, megabytes / csv_time, megabytes / legacy_time, megabytes / typed_time))
+
+
+# Times building one trial plan for synthetic manifests with four packages per address. Every tenth package is tied to
+# the next one, and every twentieth is tied to the second truck, so the loader has groups and truck constraints to
+# honour. Checks that every package is loaded exactly once, on a truck it is allowed on.
+def benchmark_loading(sizes, seed=0):
+    print("\nloading")
+    print("{:>10} {:>14} {:>14} {:>14}".format("packages", "groups (s)", "trial (s)", "segments"))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size in sizes:
+            filename = os.path.join(temp_dir, "distances_" + str(size) + ".csv")
+            generate_distance_csv(filename, size + 1, seed)
+            distances = DistanceTable()
+            distances.populate(filename)
+            distances.prune()
+
+            packages = PackageTable()
+            for package in generate_packages(size * 4, distances.address_list[1:], seed):
+                if package.package_id % 10 == 0:
+                    package.tiedToPackage = [package.package_id + 1]
+                if package.package_id % 20 == 0:
+                    package.tiedToTruck = 2
+                packages.insert(package)
+            route = Route(distances, packages, [Truck(1), Truck(2)])
+            route.flatten()
+
+            start = time.perf_counter()
+            packages.tied_groups()
+            group_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            plan = route.trial_solution([[truck, 8] for truck in route.trucks], route.address_priority_deadline_angle)
+            trial_time = time.perf_counter() - start
+
+            loaded = [package for segment in plan for package in segment.package_list.get_package(get_all=True)
+                      if package.tiedToTruck in (0, segment.truck.truckId)]
+            if sorted(package.package_id for package in loaded) != list(range(1, size * 4 + 1)):
+                raise ValueError("Loading mismatch for " + str(size * 4) + " packages")
+            print("{:>10} {:>14.4f} {:>14.4f} {:>14}".format(size * 4, group_time, trial_time, len(plan)))
+
+
+# Times building one trial plan for a fleet of trucks, with packages arriving at the hub at random times over the
+# day. Idle trucks wait for the next arrival instead of polling, so the number of dispatch events stays close to the
+# number of segments. Checks that every package is loaded, and never before it arrives.
+def benchmark_dispatch(sizes, trucks=10, seed=0):
+    print("\ndispatch")
+    print("{:>10} {:>14} {:>14} {:>14}".format("packages", "trucks", "trial (s)", "segments"))
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size in sizes:
+            filename = os.path.join(temp_dir, "distances_" + str(size) + ".csv")
+            generate_distance_csv(filename, size + 1, seed)
+            distances = DistanceTable()
+            distances.populate(filename)
+            distances.prune()
+
+            packages = PackageTable()
+            for package in generate_packages(size * 4, distances.address_list[1:], seed):
+                package.availability = rng.choice([0, 0, rng.uniform(8, 17)])
+                packages.insert(package)
+            route = Route(distances, packages, [Truck(truck_id) for truck_id in range(1, trucks + 1)])
+            route.flatten()
+
+            start = time.perf_counter()
+            plan = route.trial_solution([[truck, 8] for truck in route.trucks], route.address_priority_deadline_angle)
+            trial_time = time.perf_counter() - start
+
+            loaded = [package for segment in plan for package in segment.package_list.get_package(get_all=True)
+                      if package.availability <= segment.start_time]
+            if sorted(package.package_id for package in loaded) != list(range(1, size * 4 + 1)):
+                raise ValueError("Dispatch mismatch for " + str(size * 4) + " packages")
+            print("{:>10} {:>14} {:>14.4f} {:>14}".format(size * 4, trucks, trial_time, len(plan)))
+
+
+# Times drawing a budget of init vectors for fleets of trucks that all start at 8, each with its own capacity, so every
+# order of the fleet is a distinct vector. Reports how many distinct orders of the first six trucks the budget covers.
+def benchmark_init_vectors(truck_counts, vectors=64, seed=0):
+    print("\ninit vectors")
+    print("{:>10} {:>14} {:>14}".format("trucks", "draw (s)", "prefixes"))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filename = os.path.join(temp_dir, "distances.csv")
+        generate_distance_csv(filename, 26, seed)
+        distances = DistanceTable()
+        distances.populate(filename)
+        distances.prune()
+        packages = PackageTable()
+        for package in generate_packages(40, distances.address_list[1:], seed):
+            packages.insert(package)
+
+        for truck_count in truck_counts:
+            route = Route(distances, packages, [Truck(truck_id, capacity=10 + truck_id)
+                                                for truck_id in range(1, truck_count + 1)])
+            start = time.perf_counter()
+            init_vectors = list(itertools.islice(route.generate_init_vectors(), vectors))
+            draw_time = time.perf_counter() - start
+            prefixes = {tuple(truck.truckId for truck, start_time in init_vector[:6]) for init_vector in init_vectors}
+            print("{:>10} {:>14.4f} {:>14}".format(truck_count, draw_time, len(prefixes)))
+
+
+# Times status lookups against a Timeline built from one trial plan: a status for every package at each query time,
+# and a count of each status at each query time. The counts must match the individual statuses.
+def benchmark_status(sizes, queries=100, seed=0):
+    print("\nstatus")
+    print("{:>10} {:>14} {:>14} {:>14}".format("packages", "build (s)", "status (s)", "count (s)"))
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size in sizes:
+            filename = os.path.join(temp_dir, "distances_" + str(size) + ".csv")
+            generate_distance_csv(filename, size + 1, seed)
+            distances = DistanceTable()
+            distances.populate(filename)
+            distances.prune()
+
+            packages = PackageTable()
+            for package in generate_packages(size * 4, distances.address_list[1:], seed):
+                packages.insert(package)
+            route = Route(distances, packages, [Truck(1), Truck(2)])
+            route.flatten()
+            route.plan = route.trial_solution([[truck, 8] for truck in route.trucks],
+                                              route.address_priority_deadline_angle)
+            for segment in route.plan:
+                route.calculate_segment(segment)
+            times = [rng.uniform(8, 8 + size / 10) for _ in range(queries)]
+
+            start = time.perf_counter()
+            timeline = Timeline(route.plan, packages)
+            build_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            statuses = [[timeline.status(package_id, moment) for package_id in timeline.package_timelines]
+                        for moment in times]
+            status_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            counts = [timeline.count(moment) for moment in times]
+            count_time = time.perf_counter() - start
+
+            for status_list, count in zip(statuses, counts):
+                if any(status_list.count(status) != number for status, number in count.items()):
+                    raise ValueError("Status count mismatch for " + str(size * 4) + " packages")
+            print("{:>10} {:>14.4f} {:>14.4f} {:>14.4f}".format(size * 4, build_time, status_time, count_time))
+
+
+# Times adding a package to a solved sample route at 9:30, by re-planning the segments still at the hub, against
+# solving the route again from scratch. Both plans must carry every package. Paths are relative, so this must be run
+# from the repository root.
+def benchmark_replan(repeats=3):
+    print("\nreplan")
+    print("{:>10} {:>14} {:>14}".format("mode", "time (s)", "length"))
+    for mode in ["replan", "solve"]:
+        best_time = math.inf
+        for _ in range(repeats):
+            distances = DistanceTable()
+            distances.populate("distances.csv")
+            distances.prune()
+            packages = PackageTable()
+            packages.populate("packages.csv")
+            route = Route(distances, packages, [Truck(1), Truck(2)])
+            route.flatten()
+            route.iterative_solution()
+            package = Package(len(packages) + 1, "410 S State St", "Salt Lake City", "UT", "84111", 12, 5, "")
+
+            start = time.perf_counter()
+            if mode == "replan":
+                route.add_package(package, 9.5)
+            else:
+                package.availability = 9.5
+                packages.insert(package)
+                route.iterative_solution()
+            best_time = min(best_time, time.perf_counter() - start)
+
+        loaded = sorted(item.package_id for segment in route.plan
+                        for item in segment.package_list.get_package(get_all=True))
+        if loaded != list(range(1, len(packages) + 1)):
+            raise ValueError("Package mismatch after " + mode)
+        print("{:>10} {:>14.4f} {:>14.1f}".format(mode, best_time, sum(segment.length for segment in route.plan)))
+
+
+# Times flattening a synthetic table, loading the same coordinates from the embedding cache, and adding one address to
+# the table and placing it, against flattening the grown table again. The loaded coordinates are checked to match.
+def benchmark_embedding(sizes, seed=0):
+    print("\nembedding")
+    print("{:>10} {:>14} {:>14} {:>14} {:>14}".format("addresses", "flatten (s)", "cached (s)", "add (s)",
+                                                       "re-flatten (s)"))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size in sizes:
+            filename = os.path.join(temp_dir, "distances_" + str(size) + ".csv")
+            cache_filename = os.path.join(temp_dir, "distances_" + str(size) + ".embedding")
+            generate_distance_csv(filename, size + 2, seed)
+            distances = DistanceTable()
+            distances.populate(filename)
+
+            # Hold back the last address, to be added later.
+            n = size + 1
+            address = distances.address_list.pop()
+            del distances.address_index[address]
+            direct_distances = distances.distanceMatrix[n * (n + 1) // 2:n * (n + 1) // 2 + n].tolist()
+            del distances.distanceMatrix[n * (n + 1) // 2:]
+            distances.prune()
+
+            route = Route(distances, PackageTable(), [Truck(1)])
+            start = time.perf_counter()
+            route.flatten(cache_str=cache_filename)
+            flatten_time = time.perf_counter() - start
+
+            cached = Route(distances, PackageTable(), [Truck(1)])
+            start = time.perf_counter()
+            cached.flatten(cache_str=cache_filename)
+            cached_time = time.perf_counter() - start
+            if cached.dFlattened != route.dFlattened:
+                raise ValueError("Cached embedding mismatch for " + str(size) + " addresses")
+
+            start = time.perf_counter()
+            route.add_address(address, direct_distances)
+            add_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            Route(distances, PackageTable(), [Truck(1)]).flatten()
+            reflatten_time = time.perf_counter() - start
+            print("{:>10} {:>14.4f} {:>14.4f} {:>14.4f} {:>14.4f}".format(size, flatten_time, cached_time, add_time,
+                                                                          reflatten_time))
+
+
+# Returns a description of each problem with a plan's schedule: a trip that leaves before its truck's start time,
+# that returns after its truck's shift ends, or that leaves less than 30 minutes after the same truck's previous trip
+# returns.
+def schedule_problems(plan):
+    problems = []
+    truck_trips = {}
+    for segment in plan:
+        truck_trips.setdefault(segment.truck.truckId, []).append(segment)
+    for truck_id, trips in truck_trips.items():
+        trips.sort(key=lambda segment: segment.start_time)
+        previous_end = trips[0].truck.start_time - 30 / 60
+        for segment in trips:
+            if segment.start_time < previous_end + 30 / 60 - 1e-9:
+                problems.append("Truck " + str(truck_id) + " leaves at " + str(segment.start_time) +
+                                " before it is ready at " + str(previous_end + 30 / 60))
+            if segment.end_time > segment.truck.end_time + 1e-9:
+                problems.append("Truck " + str(truck_id) + " returns at " + str(segment.end_time) +
+                                " after its shift ends at " + str(segment.truck.end_time))
+            previous_end = segment.end_time
+    return problems
+
+
+# Solves random fleets of one to four trucks, of mixed capacity and speed, some at depots other than the hub, on small
+# synthetic instances, and checks the schedule of every plan with schedule_problems. Every truck after the first has a
+# random shift window, so some trips are trimmed to end in time and some trucks leave service early.
+def benchmark_schedules(count=150, max_vectors=4, seed=0):
+    print("\nschedules")
+    print("{:>10} {:>14} {:>14}".format("plans", "trips", "time (s)"))
+    rng = random.Random(seed)
+    trips = 0
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for instance in range(count):
+            size = rng.randint(10, 40)
+            filename = os.path.join(temp_dir, "distances_" + str(instance) + ".csv")
+            generate_distance_csv(filename, size + 1, seed + instance)
+            distances = DistanceTable()
+            distances.populate(filename)
+            distances.prune()
+
+            packages = PackageTable()
+            for package in generate_packages(size * 2, distances.address_list[1:], seed + instance):
+                package.availability = rng.choice([0, 0, 9 + 5 / 60, 10 + 20 / 60])
+                packages.insert(package)
+            trucks = []
+            for truck_id in range(1, rng.randint(1, 4) + 1):
+                depot = rng.choice([None, rng.choice(distances.address_list)])
+                truck = Truck(truck_id, capacity=rng.randint(8, 24), speed=rng.choice([18, 25]), depot=depot)
+                if truck_id > 1:
+                    truck.start_time = rng.choice([8, 8, 9, 10])
+                    truck.end_time = rng.choice([math.inf, truck.start_time + 1, truck.start_time + 3])
+                trucks.append(truck)
+
+            route = Route(distances, packages, trucks)
+            route.flatten()
+            route.iterative_solution(max_vectors=max_vectors)
+            problems = schedule_problems(route.plan)
+            if len(problems) > 0:
+                raise ValueError("Schedule problems in instance " + str(instance) + ": " + "; ".join(problems))
+            trips += len(route.plan)
+    print("{:>10} {:>14} {:>14.4f}".format(count, trips, time.perf_counter() - start))
+
+
+# Solves synthetic instances with a second depot at the address farthest from the hub, and two trucks at each depot, one
+# of them larger and faster. The fleet is solved in one pass, and as separate runs per depot with each package sent to
+# its nearer depot, as before trucks had their own depots. A third run adds to the hub trucks one small truck at the
+# other depot whose shift ends at 8:30, so the hub trucks must take over the addresses nearer to it. Every trip is
+# checked to be back by the end of its truck's shift.
+def benchmark_fleet(sizes, max_vectors=4, seed=0):
+    print("\nfleet")
+    print("{:>10} {:>10} {:>14} {:>14} {:>14}".format("addresses", "mode", "solve (s)", "length", "missed"))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size in sizes:
+            filename = os.path.join(temp_dir, "distances_" + str(size) + ".csv")
+            generate_distance_csv(filename, size + 1, seed)
+            distances = DistanceTable()
+            distances.populate(filename)
+            distances.prune()
+            hub = distances.address_list[0]
+            far = max(distances.address_list, key=lambda address: distances.dist(hub, address))
+            package_list = generate_packages(size * 3, distances.address_list[1:], seed)
+            fleets = {hub: [Truck(1), Truck(2, capacity=24, speed=25)],
+                      far: [Truck(3, depot=far), Truck(4, depot=far, capacity=24, speed=25)]}
+
+            runs = {"one pass": [[package_list, fleets[hub] + fleets[far]]], "per depot": []}
+            for depot in fleets:
+                nearest = [package for package in package_list
+                           if min(fleets, key=lambda other: distances.dist(other, package.address)) == depot]
+                runs["per depot"].append([nearest, fleets[depot]])
+            runs["shift end"] = [[package_list, fleets[hub] + [Truck(5, depot=far, capacity=2, end_time=8.5)]]]
+
+            for mode, run_list in runs.items():
+                solve_time, length, missed = 0, 0, 0
+                for run_packages, trucks in run_list:
+                    packages = PackageTable()
+                    for package in run_packages:
+                        packages.insert(copy.copy(package))
+                    route = Route(distances, packages, trucks)
+                    start = time.perf_counter()
+                    route.flatten()
+                    route.iterative_solution(max_vectors=max_vectors)
+                    solve_time += time.perf_counter() - start
+                    length += sum(segment.length for segment in route.plan)
+                    missed += sum(segment.missed_deadlines for segment in route.plan)
+                    for segment in route.plan:
+                        if segment.end_time > segment.truck.end_time + 1e-9:
+                            raise ValueError("Truck " + str(segment.truck.truckId) + " is back after its shift ends")
+                print("{:>10} {:>10} {:>14.4f} {:>14.1f} {:>14}".format(size, mode, solve_time, length, missed))
+
+
+# Times flatten and iterative_solution on the sample data, sequentially and with the given number of worker processes,
+# and checks that both choose the same plan. Paths are relative, so this must be run from the repository root.
+def benchmark_solve(workers, repeats=3):
+    print("\nsolve")
+    print("{:>10} {:>14} {:>14}".format("workers", "solve (s)", "length"))
+    plans = []
+    for worker_count in [1, workers]:
+        best_time = math.inf
+        for _ in range(repeats):
+            distances = DistanceTable()
+            distances.populate("distances.csv")
+            distances.prune()
+            packages = PackageTable()
+            packages.populate("packages.csv")
+            route = Route(distances, packages, [Truck(1), Truck(2)])
+
+            start = time.perf_counter()
+            route.flatten()
+            route.iterative_solution(worker_count)
+            best_time = min(best_time, time.perf_counter() - start)
+
+        plans.append([[segment.truck.truckId, segment.start_time, segment.address_sequence] for segment in route.plan])
+        print("{:>10} {:>14.4f} {:>14.1f}".format(worker_count, best_time,
+                                                  sum(segment.length for segment in route.plan)))
+
+    if plans[0] != plans[1]:
+        raise ValueError("Parallel solve chose a different plan")
+
+
+# ==========================
+# Benchmark suite.
+# ==========================
+
+# Times each stage of the pipeline on a seeded synthetic instance with the given number of stops, four packages per
+# stop, and the given number of trucks. Returns a dict mapping track names to the best time in seconds over the
+# repeats, though a stage that takes over a second is only run once. Tracks are populate, prune, flatten, trial plan
+# (one trial_solution, which optimizes each trip as it schedules it), optimize plan (calculate_segment with optimize
+# on every segment of a fresh trial plan, built untimed before each repeat), solve (iterative_solution with up to
+# max_vectors init vectors) and end to end (the sum of populate, prune, flatten and solve). Prune is O(n^3), so it is
+# skipped above prune_limit stops, and the later stages then run on the direct distances.
+def suite_instance(temp_dir, stops, trucks, repeats, max_vectors, prune_limit, seed):
+    filename = os.path.join(temp_dir, "distances_" + str(stops) + ".csv")
+    if not os.path.exists(filename):
+        generate_distance_csv(filename, stops + 1, seed)
+
+    tracks = {}
+
+    # Times function over the repeats. If setup is given, it is called untimed before each repeat, and its result is
+    # passed to function.
+    def track(name, function, setup=None):
+        best_time = math.inf
+        result = None
+        for _ in range(repeats):
+            args = [] if setup is None else [setup()]
+            start = time.perf_counter()
+            result = function(*args)
+            best_time = min(best_time, time.perf_counter() - start)
+            if best_time > 1:
+                break
+        tracks[name] = best_time
+        return result
+
+    distances = DistanceTable()
+    track("populate", lambda: distances.populate(filename))
+    if stops <= prune_limit:
+        track("prune", distances.prune)
+
+    packages = PackageTable()
+    for package in generate_manifest(stops * 4, distances.address_list[1:], trucks, seed):
+        packages.insert(package)
+    route = Route(distances, packages, [Truck(truck_id) for truck_id in range(1, trucks + 1)])
+    track("flatten", route.flatten)
+
+    init_vector = [[truck, truck.start_time] for truck in route.trucks]
+    track("trial plan", lambda: route.trial_solution(init_vector, route.address_priority_deadline_angle))
+
+    def optimize_plan(plan):
+        for segment in plan:
+            route.calculate_segment(segment, optimize=True)
+    track("optimize plan", optimize_plan,
+          lambda: route.trial_solution(init_vector, route.address_priority_deadline_angle))
+    track("solve", lambda: route.iterative_solution(max_vectors=max_vectors))
+
+    tracks["end to end"] = tracks["populate"] + tracks.get("prune", 0) + tracks["flatten"] + tracks["solve"]
+    return tracks
+
+
+# Runs suite_instance for every combination of stop count and truck count, and prints each track. Results are keyed
+# "track/stops/trucks". If baseline names an existing JSON file written by an earlier run, each track is compared with
+# it, and tracks slower than the baseline by more than the tolerance, and by more than noise seconds, are marked as
+# regressions. If save names a file, the results are written to it as a new baseline. Returns the results and the
+# list of regressed tracks.
+def benchmark_suite(sizes, truck_counts, repeats=3, max_vectors=4, prune_limit=500, seed=0, baseline=None, save=None,
+                    tolerance=0.25, noise=0.005):
+    print("\nsuite")
+    print("{:>16} {:>8} {:>8} {:>14} {:>14} {:>10}".format("track", "stops", "trucks", "time (s)", "baseline (s)",
+                                                         "ratio"))
+    baseline_results = {}
+    if baseline is not None and os.path.exists(baseline):
+        with open(baseline) as baseline_file:
+            baseline_results = json.load(baseline_file)["results"]
+
+    results = {}
+    regressions = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for stops in sizes:
+            for trucks in truck_counts:
+                tracks = suite_instance(temp_dir, stops, trucks, repeats, max_vectors, prune_limit, seed)
+                for name, seconds in tracks.items():
+                    key = name + "/" + str(stops) + "/" + str(trucks)
+                    results[key] = seconds
+                    baseline_time = "-"
+                    ratio = "-"
+                    if key in baseline_results:
+                        baseline_time = "{:.4f}".format(baseline_results[key])
+                        ratio = "{:.2f}".format(seconds / max(baseline_results[key], 1e-9))
+                        slower = seconds - baseline_results[key]
+                        if slower > baseline_results[key] * tolerance and slower > noise:
+                            regressions.append(key)
+                            ratio += " !"
+                    print("{:>16} {:>8} {:>8} {:>14.4f} {:>14} {:>10}".format(name, stops, trucks, seconds,
+                                                                             baseline_time, ratio))
+
+    if save is not None:
+        with open(save, "w") as save_file:
+            json.dump({"python": sys.version.split()[0], "seed": seed, "repeats": repeats, "max_vectors": max_vectors,
+                       "results": results}, save_file, indent=2)
+    if len(regressions) > 0:
+        print("Regressions over " + str(round(tolerance * 100)) + "%:", ", ".join(regressions))
+    return results, regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the expensive stages against synthetic data.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[25, 100, 500],
+                        help="Number of addresses in each synthetic distance table.")
+    parser.add_argument("--legacy-limit", type=int, default=25,
+                        help="Largest table size to run the legacy pruner on.")
+    parser.add_argument("--legacy-populate-limit", type=int, default=500,
+                        help="Largest table size to run the legacy loader on.")
+    parser.add_argument("--package-sizes", type=int, nargs="+", default=[40, 1000, 10000],
+                        help="Number of packages in each synthetic package table.")
+    parser.add_argument("--manifest-sizes", type=int, nargs="+", default=[1000, 50000, 200000],
+                        help="Number of packages in each synthetic manifest for the memory benchmark.")
+    parser.add_argument("--scan-limit", type=int, default=2000,
+                        help="Largest package table to run the full field scan on.")
+    parser.add_argument("--flatten-sizes", type=int, nargs="+", default=[25, 100, 300],
+                        help="Number of addresses in each flatten benchmark.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Number of worker processes for the parallel solve.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the synthetic data generators.")
+    parser.add_argument("--report",
+                        help="Write a JSON report of the stage timings and counters of the run to this file.")
+    parser.add_argument("--profile", action="store_true",
+                        help="Include a cProfile summary and the tracemalloc memory peak in the report.")
+    parser.add_argument("--suite", action="store_true",
+                        help="Run the per-stage benchmark suite instead of the individual benchmarks.")
+    parser.add_argument("--suite-sizes", type=int, nargs="+", default=[25, 100, 500],
+                        help="Number of stops in each benchmark suite instance, up to 5000.")
+    parser.add_argument("--trucks", type=int, nargs="+", default=[2, 8],
+                        help="Number of trucks in each benchmark suite instance.")
+    parser.add_argument("--prune-limit", type=int, default=500,
+                        help="Largest benchmark suite instance to run prune on.")
+    parser.add_argument("--baseline", help="Compare the benchmark suite against the results saved in this file.")
+    parser.add_argument("--save", help="Save the benchmark suite results to this file, as a new baseline.")
+    args = parser.parse_args()
+
+    if args.report:
+        instruments.enable(profile=args.profile, trace_memory=args.profile)
+
+    if args.suite:
+        suite_results, suite_regressions = benchmark_suite(args.suite_sizes, args.trucks, prune_limit=args.prune_limit,
+                                                           seed=args.seed, baseline=args.baseline, save=args.save)
+        if args.report:
+            instruments.disable()
+            instruments.write_report(args.report)
+        sys.exit(1 if len(suite_regressions) > 0 else 0)
+
+    benchmark_csv(args.sizes, args.manifest_sizes, args.seed)
+    benchmark_populate(args.sizes, args.legacy_populate_limit, args.seed)
+    benchmark_prune(args.sizes, args.legacy_limit, args.seed)
+    benchmark_cache(args.sizes, args.seed)
+    benchmark_package_lookup(args.package_sizes, args.scan_limit, args.seed)
+    benchmark_package_memory(args.manifest_sizes, args.seed)
+    benchmark_priority(args.package_sizes, seed=args.seed)
+    benchmark_evaluate(args.sizes, args.seed)
+    benchmark_rotations(args.sizes, args.seed)
+    benchmark_local_search(args.sizes, seed=args.seed)
+    benchmark_loading(args.sizes, args.seed)
+    benchmark_dispatch(args.sizes, seed=args.seed)
+    benchmark_init_vectors([8, 12, 20, 40])
+    benchmark_status(args.sizes, seed=args.seed)
+    benchmark_flatten(args.flatten_sizes, seed=args.seed)
+    benchmark_embedding(args.sizes, args.seed)
+    benchmark_fleet(args.flatten_sizes, seed=args.seed)
+    benchmark_schedules(seed=args.seed)
+    benchmark_solve(args.workers)
+    benchmark_replan()
+
+    if args.report:
+        instruments.disable()
+        instruments.write_report(args.report)
@@ -7,29 +7,79 @@
 # =================================================================================================
 
 # Variables for later.
-import copy
+import csv
+import hashlib
 import math
+import os
+import struct
+import sys
+from array import array
+from instrumentation import instruments
 
-
-def read_csv(filename):
-    my_file = open(filename)
-    temp_list = my_file.readlines()
-    parsed_list = []
-    for line in temp_list:
-        parsed_list.append(line.split(','))
-    my_file.close()
-    return parsed_list
+# The prune cache is a binary file holding a header, followed by the n * n pruned distances as doubles and the n * n
+# predecessor indices as 32 bit integers, both row by row in native byte order. The header holds a magic string, the
+# SHA-256 digest of the source CSV file and the number of addresses. See DistanceTable.save_cache.
+CACHE_MAGIC = b"TSPPRUNE"
+CACHE_HEADER = struct.Struct("8s32sI")
 
 
-# Used for representing packages.
+def read_csv(filename):
+    return list(iter_csv(filename))
+
+
+# Yields the rows of a CSV file one at a time, split into fields, so that large files are never held in memory.
+def iter_csv(filename):
+    for line_number, row in iter_csv_lines(filename):
+        yield row
+
+
+# Yields [line number, fields] for each row of a CSV file, read through a buffered file with the csv module, so quoted
+# fields may hold commas and line endings are dropped. Blank lines are skipped. Malformed rows raise a ValueError naming
+# the file and line.
+def iter_csv_lines(filename):
+    with open(filename, newline="") as my_file:
+        reader = csv.reader(my_file)
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as error:
+                raise ValueError(csv_location(filename, reader.line_num) + str(error)) from None
+            if len(row) > 0:
+                yield [reader.line_num, row]
+
+
+# Prefix for CSV parse errors, naming the file and line.
+def csv_location(filename, line_number):
+    return str(filename) + ", line " + str(line_number) + ": "
+
+
+# Yields a package for each row of a package CSV file, as the file is read. Rows hold the id, street, city, state, zip
+# code, deadline, weight and an optional special note. The id, deadline and weight are typed as Package does.
+def iter_packages(filename):
+    for line_number, line in iter_csv_lines(filename):
+        if len(line) < 7 or any(line[8:]):
+            raise ValueError(csv_location(filename, line_number) + "expected 7 or 8 fields, found " + str(len(line)))
+        try:
+            yield Package(line[0], line[1], line[2], line[3], line[4], line[5], line[6], "".join(line[7:8]))
+        except ValueError as error:
+            raise ValueError(csv_location(filename, line_number) + str(error)) from None
+
+
+# Used for representing packages. Packages are held in large numbers, so __slots__ is used to drop the per-instance
+# dict, and the address strings are interned, so that packages going to the same address share one copy.
 class Package:
+    __slots__ = ("package_id", "street", "city", "state", "zip_code", "address", "weight", "specialNote",
+                 "availability", "deadline", "tiedToPackage", "tiedToTruck", "status", "delivery_time")
+
     def __init__(self, package_id, street, city, state, zip_code, deadline, weight, special_note):
         self.package_id = int(package_id)
-        self.street = street
-        self.city = city
-        self.state = state
-        self.zip_code = zip_code
-        self.address = str(street) + " (" + str(zip_code) + ")"  # address usable w/ the distance matrix
+        self.street = sys.intern(str(street))
+        self.city = sys.intern(str(city))
+        self.state = sys.intern(str(state))
+        self.zip_code = sys.intern(str(zip_code))
+        self.address = sys.intern(self.street + " (" + self.zip_code + ")")  # address usable w/ the distance matrix
         self.weight = int(weight)
         self.specialNote = special_note
 
@@ -42,174 +92,348 @@ class Package:
         self.delivery_time = math.inf
 
     def __str__(self):
-        if self.status == "Delivered":
-            proper_delivery_time = self.delivery_time
+        return self.describe(self.status, self.delivery_time)
+
+    # Formats the package with the given status and delivery time, without changing the package.
+    def describe(self, status, delivery_time):
+        if status == "Delivered":
+            proper_delivery_time = delivery_time
         else:
             proper_delivery_time = "N/A"
         return ("ID: " + str(self.package_id) + " Street: " + str(self.street) +
                 " City: " + str(self.city) + " State: " + str(self.state) + " Zipcode: " +
                 str(self.zip_code) + " Deadline: " + str(self.deadline) + " Weight: " + str(self.weight) +
-                " Status: " + str(self.status) + " Delivery Time: " + str(proper_delivery_time))
+                " Status: " + str(status) + " Delivery Time: " + str(proper_delivery_time))
+
+
+# Aggregates of the packages going to one address, used by the router to prioritize addresses.
+class AddressSummary:
+    __slots__ = ("deadline", "tied_to_truck", "availability", "package_count")
+
+    def __init__(self):
+        self.deadline = 24  # Earliest deadline of the packages, or 24 if there are none.
+        self.tied_to_truck = False  # True if any of the packages may only go on a specific truck.
+        self.availability = 0  # Latest availability of the packages, the earliest time all of them can be loaded.
+        self.package_count = 0
+
+
+# Packages that must go on the same truck, found by following the tiedToPackage links of every package in either
+# direction. A group is always loaded whole.
+class PackageGroup:
+    __slots__ = ("packages", "trucks", "availability")
+
+    def __init__(self):
+        self.packages = []
+        self.trucks = set()  # Truck ids the packages are tied to. Empty if any truck may carry the group.
+        self.availability = 0  # Latest availability of the packages, the earliest time the group can be loaded.
 
 
+# A truck in the fleet. Trucks may differ in capacity, speed, home depot and shift window.
 class Truck:
-    def __init__(self, truck_id):
+    def __init__(self, truck_id, capacity=16, speed=18, depot=None, start_time=8, end_time=math.inf):
         self.truckId = truck_id
         self.packages = None
-        self.capacity = 16
-        self.speed = 18
+        self.capacity = capacity
+        self.speed = speed
         self.miles = 0
+        self.depot = depot  # Address the truck leaves from and returns to. None for the hub, the first address.
+        self.start_time = start_time  # Earliest time the truck may leave its depot.
+        self.end_time = end_time  # Time the shift ends. Every trip must be back at the depot by then.
 
 # Class which initializes and holds the distance data, and allows for lookup of a distance by providing
 # any two addresses.
 class DistanceTable:
     def __init__(self):
         self.address_list = []
-        self.distanceMatrix = {}
-        self.prunedDistanceMatrix = {}
-        self.path = {}
 
-    def populate(self, input_str):
-        distance_import = read_csv(input_str)
+        # Direct distances from the CSV file, stored as a flat lower triangle. The distance between address i and an
+        # address j <= i is found at distanceMatrix[i * (i + 1) // 2 + j]. See triangle_index.
+        self.distanceMatrix = array("d")
+
+        # Index based representation, used by the lookups on the hot path. Addresses are mapped to their row in the
+        # CSV file, and matrix[i][j] holds the pruned distance between address i and address j.
+        self.address_index = {}
+        self.matrix = []
+        self.predecessor = []  # predecessor[i][j] is the index visited just before j on the shortest path from i.
+
+        # SHA-256 digest of the CSV file the table was populated from. Identifies the table in the prune cache.
+        self.source_hash = b""
 
-        # Generate the list of addresses. Order is significant, to determine index to generate keys.
-        for item in distance_import:
+    # Reads the lower-triangular distance table in a single pass. Row i holds the address, followed by the distances
+    # to addresses 0 through i, which are appended directly onto the flat triangle.
+    @instruments.timed("populate distances")
+    def populate(self, input_str):
+        self.address_list = []
+        self.address_index = {}
+        self.distanceMatrix = array("d")
+
+        # The file is hashed in blocks, so it is never held in memory whole.
+        source_hash = hashlib.sha256()
+        with open(input_str, "rb") as csv_file:
+            for block in iter(lambda: csv_file.read(1 << 20), b""):
+                source_hash.update(block)
+        self.source_hash = source_hash.digest()
+
+        for i, [line_number, item] in enumerate(iter_csv_lines(input_str)):
+            if len(item) < i + 2 or item[0] == "":
+                raise ValueError(csv_location(input_str, line_number) + "expected an address and " + str(i + 1) +
+                                 " distances")
+            try:
+                self.distanceMatrix.extend(map(float, item[1:i + 2]))
+            except ValueError as error:
+                raise ValueError(csv_location(input_str, line_number) + str(error)) from None
+            self.address_index[item[0]] = i
             self.address_list.append(item[0])
 
-        # Populate the distance matrix.
-        for item1 in self.address_list:
-            for item2 in self.address_list:
-                # The dictionary key is the two concatenated addresses, with the lexicographically greater string
-                # first. Additionally, the matrix will store a list of addresses indicating the actual fastest route.
-                # This list begins with the greater address, and until pruning is done, is just the start and end given.
-                if item1 > item2:
-                    combined_key = item1 + item2
-                    self.distanceMatrix[combined_key] = [None, [item1, item2]]
-                else:
-                    combined_key = item2 + item1
-                    self.distanceMatrix[combined_key] = [None, [item2, item1]]
-
-                # The matrix in the CSV file is populated at the bottom only. So the larger index must go first.
-                # The second index is incremented by one to skip the address string.
-                ind1 = self.address_list.index(item1)
-                ind2 = self.address_list.index(item2)
-                if ind1 > ind2:
-                    self.distanceMatrix[combined_key][0] = float(distance_import[ind1][ind2 + 1])
-                else:
-                    self.distanceMatrix[combined_key][0] = float(distance_import[ind2][ind1 + 1])
-
-        # Copy into the pruned list - all functions will reference this list even if prune is not run.
-        self.prunedDistanceMatrix = copy.deepcopy(self.distanceMatrix)
-
-    # Returns the distance between the two points
+        # Build the index based matrix. Until prune is run, every shortest path is the direct one.
+        self.matrix = self.direct_matrix()
+        self.predecessor = [[i] * len(self.address_list) for i in range(len(self.address_list))]
+
+    # Position of the distance between two address indices in the flat lower triangle.
+    def triangle_index(self, index1, index2):
+        if index1 < index2:
+            index1, index2 = index2, index1
+        return index1 * (index1 + 1) // 2 + index2
+
+    # Expands the triangle of direct distances into a full, symmetric 2D list.
+    def direct_matrix(self):
+        n = len(self.address_list)
+        matrix = [[0.0] * n for _ in range(n)]
+        triangle = self.distanceMatrix
+        for i in range(n):
+            row_start = i * (i + 1) // 2
+            row = matrix[i]
+            row[:i + 1] = triangle[row_start:row_start + i + 1]
+            for j in range(i):
+                matrix[j][i] = row[j]
+        return matrix
+
+    # Returns the distance between the two points. The pruned distance is a thin wrapper around the index based matrix.
     def dist(self, address1, address2, search_pruned=True):
-        if address1 > address2:
-            combined_key = address1 + address2
-        else:
-            combined_key = address2 + address1
+        instruments.count("distance lookups")
+        index1 = self.address_index[address1]
+        index2 = self.address_index[address2]
         if search_pruned:
-            return float(self.prunedDistanceMatrix[combined_key][0])
-        else:
-            return float(self.distanceMatrix[combined_key][0])
+            return self.matrix[index1][index2]
+        return self.distanceMatrix[self.triangle_index(index1, index2)]
 
+    # Returns the shortest path between the two points, beginning with the lexicographically greater address.
     def path(self, address1, address2):
         if address1 > address2:
-            combined_key = address1 + address2
+            return self.build_path(self.predecessor, self.address_index[address1], self.address_index[address2])
         else:
-            combined_key = address2 + address1
-        return self.prunedDistanceMatrix[combined_key][1]
+            return self.build_path(self.predecessor, self.address_index[address2], self.address_index[address1])
+
+    # Converts a list of addresses into a list of matrix indices.
+    def indices(self, addresses):
+        address_index = self.address_index
+        return [address_index[address] for address in addresses]
+
+    # Returns the pruned distance between two address indices.
+    def dist_index(self, index1, index2):
+        return self.matrix[index1][index2]
+
+    # Vectorized lookup. Accepts two equal length sequences of address indices, and returns the list of pruned
+    # distances between each pair.
+    def dist_many(self, indices1, indices2):
+        instruments.count("distance lookups", len(indices1))
+        matrix = self.matrix
+        return [matrix[i][j] for i, j in zip(indices1, indices2)]
 
     # The direct route is not always the fastest way between two addresses. Prune eliminates such routes and generates
-    # the shortest path between two points for all points.
-    def prune(self):
-        # Each address pair will be checked.
-        for item in self.prunedDistanceMatrix.values():
-            path_len = item[0]  # Set shortest known path to the direct path initially.
-            route = item[1]  # The route in the item - for now just the start and end.
-
-            # List of routes to evaluate. Will initialize with a path length of zero, and the starting point.
-            candidate_routes = [[0, item[1][0]]]
-            incomplete_routes = True
-
-            # Will evaluate a list of routes. Any that have distances larger than the known best will be eliminated.
-            # Routes that have a running length less than the known best will stay in consideration until the next
-            # hop can be evaluated.
-            while incomplete_routes:
-                complete_routes = 0  # Loop control variable.
-                temp_list = copy.copy(candidate_routes)  # Need a copy as the original list is being modified.
-
-                for trialRoute in temp_list:
-                    # Search for complete routes, e.g. routes that terminate at the desired address. Then perform
-                    # needed operations.
-                    if trialRoute[len(trialRoute) - 1] == route[len(route) - 1]:
-
-                        # Loop control. If the list only contains completed routes - which happens when all other
-                        # options have been exhausted, pruning is finished for the one item.
-                        complete_routes += 1
-                        if complete_routes >= len(temp_list):
-                            incomplete_routes = False
-
-                        # Remove complete routes which are worse than the known best route.
-                        if trialRoute[0] > path_len + .001:
-                            candidate_routes.remove(trialRoute)
-                        elif trialRoute[0] < path_len + .001:
-                            path_len = trialRoute[0]  # Update path_len with the new best route.
-
-                        # A complete route must not have any trial addresses appended to the end, so skip the logic
-                        # below, which creates new trial routes from incomplete routes.
-                        continue
-
-                    # Create a list of addresses which have not yet been visited in the trial route.
-                    new_addresses = copy.copy(self.address_list)
-                    temp_trial_route_list = copy.copy(trialRoute)
-                    temp_trial_route_list.pop(0)
-                    for visitedAddress in temp_trial_route_list:
-                        new_addresses.remove(visitedAddress)
-
-                    # The next destination to test may be any not visited already.
-                    for address in new_addresses:
-
-                        # Create a new route object to add to potentially add to the list of candidates.
-                        new_route = copy.copy(trialRoute)
-
-                        # Compute length of the next hop, and add that hop to the route
-                        trial_segment = float(self.dist(trialRoute[len(trialRoute) - 1], address, search_pruned=False))
-                        new_route[0] += trial_segment
-                        new_route.append(address)
-
-                        if new_route[0] < path_len + .001:
-                            candidate_routes.append(new_route)
-
-                    # The original, incomplete route is removed.
-                    candidate_routes.remove(trialRoute)
-
-            # It may be possible that multiple alternate routes of the exact same, optimal length are provided.
-            # In this case, update only the first one.
-            # print(candidate_routes)
-            item[0] = round(candidate_routes[0][0], 1)
-            candidate_routes[0].pop(0)
-            item[1] = candidate_routes[0]
+    # the shortest path between two points for all points. Uses the Floyd-Warshall algorithm over address indices,
+    # keeping a predecessor matrix so the actual paths can be rebuilt afterwards. Runs in O(n^3).
+    # If a cache file is given, the result is loaded from it when it matches the populated CSV file, and otherwise
+    # computed and written to it. See load_cache.
+    @instruments.timed("prune")
+    def prune(self, cache_str=None):
+        if cache_str is not None and self.load_cache(cache_str):
+            return
+
+        n = len(self.address_list)
+
+        # Build the index-based distance and predecessor matrices from the direct (unpruned) distances.
+        # predecessor[i][j] holds the address index visited just before j on the best known path from i to j.
+        shortest = self.direct_matrix()
+        predecessor = [[i] * n for i in range(n)]
+
+        # Allow each address in turn to be used as an intermediate stop. A detour must be shorter by more than the
+        # tolerance below to replace the known route, so direct routes are kept when lengths are equal.
+        for k in range(n):
+            row_k = shortest[k]
+            predecessor_k = predecessor[k]
+            for i in range(n):
+                if i == k:
+                    continue
+                row_i = shortest[i]
+                d_ik = row_i[k]
+                offset = d_ik + .001
+
+                # Find the destinations that are reached faster by going through k, then update them.
+                improved = [j for j, (d_ij, d_kj) in enumerate(zip(row_i, row_k)) if offset + d_kj < d_ij]
+                predecessor_i = predecessor[i]
+                for j in improved:
+                    row_i[j] = d_ik + row_k[j]
+                    predecessor_i[j] = predecessor_k[j]
+
+        # Store the rounded distances in the index based matrix.
+        self.matrix = [[round(d_ij, 1) for d_ij in row] for row in shortest]
+        self.predecessor = predecessor
+
+        if cache_str is not None:
+            self.save_cache(cache_str)
+
+    # Writes the pruned matrix and predecessors to a cache file. The file is written under a temporary name and then
+    # renamed, so a reader never sees a partial cache.
+    def save_cache(self, cache_str):
+        n = len(self.address_list)
+        distances = array("d")
+        predecessors = array("i")
+        for i in range(n):
+            distances.extend(self.matrix[i])
+            predecessors.extend(self.predecessor[i])
+
+        temp_str = cache_str + ".tmp"
+        with open(temp_str, "wb") as cache_file:
+            cache_file.write(CACHE_HEADER.pack(CACHE_MAGIC, self.source_hash, n))
+            distances.tofile(cache_file)
+            predecessors.tofile(cache_file)
+        os.replace(temp_str, cache_str)
+
+    # Loads the pruned matrix and predecessors from a cache file. Returns False, leaving the table untouched, if the
+    # file is missing, malformed or was built from a different CSV file than the one populated.
+    def load_cache(self, cache_str):
+        n = len(self.address_list)
+        try:
+            with open(cache_str, "rb") as cache_file:
+                header = cache_file.read(CACHE_HEADER.size)
+                if len(header) != CACHE_HEADER.size:
+                    return False
+                magic, source_hash, size = CACHE_HEADER.unpack(header)
+                if magic != CACHE_MAGIC or source_hash != self.source_hash or size != n:
+                    return False
+
+                distances = array("d")
+                predecessors = array("i")
+                distances.fromfile(cache_file, n * n)
+                predecessors.fromfile(cache_file, n * n)
+        except (OSError, EOFError):
+            return False
+
+        self.matrix = [distances[i * n:(i + 1) * n].tolist() for i in range(n)]
+        self.predecessor = [predecessors[i * n:(i + 1) * n].tolist() for i in range(n)]
+        return True
+
+    # SHA-256 digest of the addresses and the pruned matrix. Identifies the shortest distances themselves, whether they
+    # came from a CSV file, the prune cache or added addresses, for caches of values derived from them such as the
+    # flattened coordinates.
+    def matrix_hash(self):
+        matrix_hash = hashlib.sha256("\n".join(self.address_list).encode())
+        for row in self.matrix:
+            matrix_hash.update(array("d", row).tobytes())
+        return matrix_hash.digest()
+
+    # Adds an address to a pruned table, given its direct distances to every address already in the table, in table
+    # order. Returns its index. The new address is reached through the existing shortest paths, then existing pairs
+    # are shortened wherever going through the new address is faster, so the table matches a full prune, up to
+    # rounding, in O(n^2) rather than O(n^3).
+    def add_address(self, address, direct_distances):
+        if address in self.address_index:
+            raise ValueError("Address is already in the table: " + address)
+        n = len(self.address_list)
+        if len(direct_distances) != n:
+            raise ValueError("Expected " + str(n) + " distances for " + address + ", got " +
+                             str(len(direct_distances)))
+        matrix = self.matrix
+        predecessor = self.predecessor
+
+        # Shortest distances from the new address, and the first address on each path. As in prune, a path must be
+        # shorter than the direct route by more than the tolerance to replace it.
+        new_row = [float(d) for d in direct_distances]
+        first_hop = list(range(n))
+        for k in range(n):
+            d_k = direct_distances[k]
+            offset = d_k + .001
+            row_k = matrix[k]
+            for j in [j for j, (d_kj, d_j) in enumerate(zip(row_k, new_row)) if offset + d_kj < d_j]:
+                new_row[j] = d_k + row_k[j]
+                first_hop[j] = k
+        new_row = [round(d, 1) for d in new_row] + [0.0]
+        new_predecessor = [n if first_hop[j] == j else predecessor[first_hop[j]][j] for j in range(n)] + [n]
+
+        # Paths to the new address are the reverse of the paths from it, so the address before it is the first hop.
+        for i in range(n):
+            row_i = matrix[i]
+            predecessor_i = predecessor[i]
+            d_in = new_row[i]
+            row_i.append(d_in)
+            predecessor_i.append(first_hop[i])
+            offset = d_in + .001
+            for j in [j for j, (d_ij, d_nj) in enumerate(zip(row_i, new_row)) if offset + d_nj < d_ij]:
+                row_i[j] = round(d_in + new_row[j], 1)
+                predecessor_i[j] = new_predecessor[j]
+        matrix.append(new_row)
+        predecessor.append(new_predecessor)
+
+        self.address_list.append(address)
+        self.address_index[address] = n
+        self.distanceMatrix.extend(direct_distances)
+        self.distanceMatrix.append(0)
+
+        # The table no longer matches its CSV file, so it must not match that file's prune cache either.
+        self.source_hash = hashlib.sha256(self.source_hash + address.encode() +
+                                          array("d", direct_distances).tobytes()).digest()
+        return n
+
+    # Walks the predecessor matrix backwards from end to start, returning the list of addresses on the path.
+    def build_path(self, predecessor, start, end):
+        route = [self.address_list[end]]
+        while end != start:
+            end = predecessor[start][end]
+            route.insert(0, self.address_list[end])
+        return route
 
 
 # Section 1 item E: Hashtable for package items. Uses lists for individual buckets to handle collisions.
+# Secondary indexes map addresses, deadlines and truck constraints to the packages that have them, so the router can
+# look packages up without scanning the table. They are updated on insert and remove. If a package is changed in place,
+# reindex must be called afterwards.
+# Per-address summaries and tied package groups are built on first use, and discarded whenever the table or its indexes
+# change.
 class PackageTable:
     def __init__(self):
         # Initialize hashtable, which will be handled via nested lists.
         self.bucketSize = 10
+        self.maxLoadFactor = 1.0  # The table doubles its buckets when it holds more packages per bucket than this.
         self.hashTable = []
         for var in range(self.bucketSize):
             self.hashTable.append([])
+        self.package_count = 0
 
-    # Accepts a file name, and populates the hash table.
+        # Secondary indexes. Each maps a value to the list of packages with that value, in insertion order.
+        self.address_index = {}
+        self.deadline_index = {}
+        self.truck_index = {}
+        self.address_summaries = None  # Maps addresses to AddressSummary objects. None until first requested.
+        self.package_groups = None  # Tied package groups and the groups at each address. None until first requested.
+
+    def __len__(self):
+        return self.package_count
+
+    # Accepts a file name, and populates the hash table. The file is streamed, one package at a time.
+    @instruments.timed("populate packages")
     def populate(self, input_str):
-        for line in read_csv(input_str):
-            my_package = Package(line[0], line[1], line[2], line[3], line[4], line[5], line[6], line[7])
+        for my_package in iter_packages(input_str):
             self.insert(my_package)
 
     # Inserts a package into the hash table.
     def insert(self, package):
+        if self.package_count + 1 > self.bucketSize * self.maxLoadFactor:
+            self.resize(self.bucketSize * 2)
         index = package.package_id % self.bucketSize
         self.hashTable[index].append(package)
+        self.package_count += 1
+        self.index_package(package)
 
     # Remove a package from the table.
     def remove(self, package):
@@ -217,6 +441,149 @@ class PackageTable:
         for item in bucket_list:
             if item.package_id == package.package_id:
                 bucket_list.pop(bucket_list.index(item))
+                self.package_count -= 1
+                self.unindex_package(item)
+                break
+
+    # Rehashes every package into a new list of buckets.
+    def resize(self, bucket_size):
+        old_table = self.hashTable
+        self.bucketSize = bucket_size
+        self.hashTable = []
+        for var in range(self.bucketSize):
+            self.hashTable.append([])
+        for bucket_list in old_table:
+            for item in bucket_list:
+                self.hashTable[item.package_id % self.bucketSize].append(item)
+
+    # Adds a package to the secondary indexes.
+    def index_package(self, package):
+        self.address_summaries = None
+        self.package_groups = None
+        self.address_index.setdefault(package.address, []).append(package)
+        self.deadline_index.setdefault(package.deadline, []).append(package)
+        self.truck_index.setdefault(package.tiedToTruck, []).append(package)
+
+    # Removes a package from the secondary indexes, dropping any value that no longer has packages.
+    def unindex_package(self, package):
+        self.address_summaries = None
+        self.package_groups = None
+        for index, key in ((self.address_index, package.address),
+                           (self.deadline_index, package.deadline),
+                           (self.truck_index, package.tiedToTruck)):
+            index_list = index[key]
+            index_list.remove(package)
+            if len(index_list) == 0:
+                del index[key]
+
+    # Rebuilds the secondary indexes. Must be called after packages in the table have been changed in place, such as
+    # correcting an address.
+    def reindex(self):
+        self.address_index = {}
+        self.deadline_index = {}
+        self.truck_index = {}
+        self.address_summaries = None
+        self.package_groups = None
+        for bucket_list in self.hashTable:
+            for item in bucket_list:
+                self.index_package(item)
+
+    # Changes fields of a package in place, given by name as on Package, such as correcting its address or tying it to
+    # a truck, and reindexes the table. If the street or zip code is changed, the address is rebuilt. If
+    # known_addresses is given, the package's address must be in it. Returns the package.
+    def update_package(self, package_id, known_addresses=None, **fields):
+        package = self.get_package(package_id=package_id)
+        if package is None:
+            raise ValueError("Package " + str(package_id) + " is not in the table")
+        for field in fields:
+            if field not in Package.__slots__:
+                raise ValueError("Package has no field " + field)
+        address = fields.get("address", package.address)
+        if "street" in fields or "zip_code" in fields:
+            street = fields.get("street", package.street)
+            zip_code = fields.get("zip_code", package.zip_code)
+            address = str(street) + " (" + str(zip_code) + ")"
+        if known_addresses is not None and address not in known_addresses:
+            raise ValueError("Package " + str(package_id) + " has an unknown address: " + address)
+
+        for field, value in fields.items():
+            setattr(package, field, value)
+        package.address = sys.intern(address)
+        self.reindex()
+        return package
+
+    # Returns the packages to be delivered to an address.
+    def get_by_address(self, address):
+        return list(self.address_index.get(address, ()))
+
+    # Returns the summary of the packages going to an address. The summaries for every address are built in one pass
+    # the first time one is requested, and reused until the table changes.
+    def address_summary(self, address):
+        if self.address_summaries is None:
+            self.address_summaries = {}
+            for key, package_list in self.address_index.items():
+                summary = AddressSummary()
+                for package in package_list:
+                    summary.deadline = min(summary.deadline, package.deadline)
+                    summary.availability = max(summary.availability, package.availability)
+                    if package.tiedToTruck != 0:
+                        summary.tied_to_truck = True
+                summary.package_count = len(package_list)
+                self.address_summaries[key] = summary
+        summary = self.address_summaries.get(address)
+        if summary is None:
+            summary = AddressSummary()
+        return summary
+
+    # Returns the groups of packages tied together, and a dict mapping each address to the indexes of the groups with a
+    # package there. Groups are the connected components of the tiedToPackage links, found with a union-find over
+    # package ids. Links to ids that are not in the table are ignored.
+    def tied_groups(self):
+        if self.package_groups is None:
+            parents = {}
+
+            def find(package_id):
+                root = package_id
+                while parents[root] != root:
+                    root = parents[root]
+                while parents[package_id] != root:
+                    parents[package_id], package_id = root, parents[package_id]
+                return root
+
+            package_list = self.get_package(get_all=True)
+            for package in package_list:
+                parents[package.package_id] = package.package_id
+            for package in package_list:
+                for tied_package_id in package.tiedToPackage:
+                    if tied_package_id in parents:
+                        parents[find(tied_package_id)] = find(package.package_id)
+
+            groups = []
+            group_index = {}
+            address_groups = {}
+            for package in package_list:
+                root = find(package.package_id)
+                if root not in group_index:
+                    group_index[root] = len(groups)
+                    groups.append(PackageGroup())
+                group = groups[group_index[root]]
+                group.packages.append(package)
+                group.availability = max(group.availability, package.availability)
+                if package.tiedToTruck != 0:
+                    group.trucks.add(package.tiedToTruck)
+                address_group_list = address_groups.setdefault(package.address, [])
+                if group_index[root] not in address_group_list:
+                    address_group_list.append(group_index[root])
+            self.package_groups = [groups, address_groups]
+        return self.package_groups
+
+    # Returns the packages with the given deadline.
+    def get_by_deadline(self, deadline):
+        return list(self.deadline_index.get(deadline, ()))
+
+    # Returns the packages tied to the given truck id. A truck id of 0 returns the packages not tied to any truck.
+    def get_by_truck(self, truck_id):
+        return list(self.truck_index.get(truck_id, ()))
 
     # Find a package from a given field, or Id. A field may return multiple matches, an Id will return only one.
     # Search by ID utilizes fast lookup of the hashtable.
@@ -227,16 +594,19 @@ class PackageTable:
                 if item.package_id == package_id:
                     return item
         elif get_all:
+            instruments.count("package scans")
             package_list = []
             for bucket_list in self.hashTable:
                 for item in bucket_list:
                     package_list.append(item)
             return package_list
         else:
+            instruments.count("package field scans")
             package_list = []
             for bucket_list in self.hashTable:
                 for item in bucket_list:
-                    for par in vars(item):
-                        if field != "" and field == vars(item)[par]:  # Search every field of every package for a match
+                    # Search every field of every package for a match.
+                    for par in Package.__slots__:
+                        if field != "" and field == getattr(item, par):
                             package_list.append(item)
             return package_list
@@ -0,0 +1,127 @@
+# =================================================================================================
+# C950 Performance Assessment
+# Name: Shane Webb
+# Student ID: 001302624
+
+# Instrumentation file - contains the stage timers, counters and profiling hooks used to see where a solve spends its
+# time, and the JSON run report built from them.
+# =================================================================================================
+
+import contextlib
+import cProfile
+import functools
+import json
+import pstats
+import time
+import tracemalloc
+
+
+# Collects per-stage wall and CPU times, named event counters, and optionally a cProfile profile and tracemalloc
+# memory peak, for one run. Nothing is collected until enable is called, so that the hooks left in the hot paths cost
+# only a method call and a flag check.
+class Instrumentation:
+    def __init__(self):
+        self.enabled = False
+        self.timers = {}  # Maps a stage name to [calls, wall seconds, CPU seconds].
+        self.counters = {}  # Maps a counter name to its count.
+        self.active = set()  # Names of the stages being timed, so a stage entered again within itself is not.
+        self.profiler = None
+        self.tracing = False  # True while this instance has tracemalloc running.
+        self.profile_stats = []  # The most expensive functions of the last profile, see stop_profile.
+        self.memory = None  # [current, peak] bytes traced by tracemalloc, once tracing has stopped.
+
+    # Starts collecting. If profile is set, the run is also profiled with cProfile, and if trace_memory is set, memory
+    # allocations are traced with tracemalloc.
+    def enable(self, profile=False, trace_memory=False):
+        self.enabled = True
+        if profile:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        if trace_memory:
+            tracemalloc.start()
+            self.tracing = True
+
+    # Stops collecting, and stops the profiler and memory tracing if they were started. Results are kept for report.
+    def disable(self, top=20):
+        self.enabled = False
+        if self.profiler is not None:
+            self.stop_profile(top)
+        if self.tracing and tracemalloc.is_tracing():
+            self.memory = list(tracemalloc.get_traced_memory())
+            tracemalloc.stop()
+        self.tracing = False
+
+    # Clears every timer, counter and result.
+    def reset(self):
+        self.timers = {}
+        self.counters = {}
+        self.profile_stats = []
+        self.memory = None
+
+    # Stops the profiler, and keeps the top functions by cumulative time as [function, calls, total s, cumulative s].
+    def stop_profile(self, top):
+        self.profiler.disable()
+        stats = pstats.Stats(self.profiler)
+        self.profiler = None
+        rows = []
+        for (filename, line, function), (_, calls, total, cumulative, _) in stats.stats.items():
+            rows.append([filename + ":" + str(line) + "(" + function + ")", calls, total, cumulative])
+        rows.sort(key=lambda row: row[3], reverse=True)
+        self.profile_stats = rows[:top]
+
+    # Adds to a named counter.
+    def count(self, name, amount=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    # Context manager which times the enclosed block as a named stage. Repeated stages accumulate. A stage entered again
+    # while it is already being timed, such as by a recursive call, is neither counted nor timed a second time.
+    @contextlib.contextmanager
+    def stage(self, name):
+        if not self.enabled or name in self.active:
+            yield
+            return
+        self.active.add(name)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            self.active.discard(name)
+            timer = self.timers.setdefault(name, [0, 0.0, 0.0])
+            timer[0] += 1
+            timer[1] += time.perf_counter() - wall_start
+            timer[2] += time.process_time() - cpu_start
+
+    # Decorator which times every call of a function as a named stage.
+    def timed(self, name):
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with self.stage(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    # Returns the collected results as plain data.
+    def report(self):
+        report = {"stages": {}, "counters": dict(sorted(self.counters.items()))}
+        for name, [calls, wall, cpu] in self.timers.items():
+            report["stages"][name] = {"calls": calls, "wall": wall, "cpu": cpu}
+        if len(self.profile_stats) > 0:
+            report["profile"] = [{"function": function, "calls": calls, "total": total, "cumulative": cumulative}
+                                 for function, calls, total, cumulative in self.profile_stats]
+        if self.memory is not None:
+            report["memory"] = {"current": self.memory[0], "peak": self.memory[1]}
+        return report
+
+    # Writes the report to a JSON file.
+    def write_report(self, filename):
+        with open(filename, "w") as report_file:
+            json.dump(self.report(), report_file, indent=2)
+
+
+# Shared instance used by the data and analytics modules.
+instruments = Instrumentation()
@@ -4,6 +4,13 @@
 
 # from data import *
 from analytics import *
+import os
+
+# Set TSP_REPORT to a file name to write a JSON report of the stage timings and counters of the solve to it. Set
+# TSP_PROFILE as well to include a cProfile summary and the tracemalloc memory peak.
+report_file = os.environ.get("TSP_REPORT")
+if report_file:
+    instruments.enable(profile=bool(os.environ.get("TSP_PROFILE")), trace_memory=bool(os.environ.get("TSP_PROFILE")))
 
 # ==========================================
 # Import project data, then generate route.
@@ -11,10 +18,11 @@ from analytics import *
 
 # Create distances and packages objects, which read provided data from CSV files.
 
-# Instantiate, then populate, then prune (optimize) the distances table.
+# Instantiate, then populate, then prune (optimize) the distances table. The pruned table is cached on disk, and is only
+# recomputed when distances.csv changes.
 distances = DistanceTable()
 distances.populate("distances.csv")
-distances.prune()
+distances.prune("distances.cache")
 
 # Instantiate, then populate the package list.
 packages = PackageTable()
@@ -23,35 +31,25 @@ truck1 = Truck(1)
 truck2 = Truck(2)
 trucks = [truck1, truck2]
 
-# Make some manual corrections to the data. Could do this in the CSV file, but serves as a good demo.
-packages.get_package(package_id=3).tiedToTruck = 2
-packages.get_package(package_id=18).tiedToTruck = 2
-packages.get_package(package_id=36).tiedToTruck = 2
-packages.get_package(package_id=38).tiedToTruck = 2
-packages.get_package(package_id=13).tiedToTruck = 2  # Indirectly tied to truck 2.
-packages.get_package(package_id=14).tiedToTruck = 2  # Indirectly tied to truck 2.
-packages.get_package(package_id=15).tiedToTruck = 2  # Indirectly tied to truck 2.
-packages.get_package(package_id=16).tiedToTruck = 2  # Indirectly tied to truck 2.
-packages.get_package(package_id=19).tiedToTruck = 2  # Indirectly tied to truck 2.
-packages.get_package(package_id=6).availability = 9 + 5 / 60
-packages.get_package(package_id=25).availability = 9 + 5 / 60
-packages.get_package(package_id=28).availability = 9 + 5 / 60
-packages.get_package(package_id=32).availability = 9 + 5 / 60
-packages.get_package(package_id=9).street = "410 S State St"
-packages.get_package(package_id=9).zip_code = 84111
-packages.get_package(package_id=9).address = "410 S State St (84111)"
-packages.get_package(package_id=9).availability = 10 + 20 / 60  # Time when address is to be fixed.
-packages.get_package(package_id=13).tiedToPackage = [13, 14, 15, 16, 18, 19]
-packages.get_package(package_id=14).tiedToPackage = [13, 14, 15, 16, 18, 19]
-packages.get_package(package_id=15).tiedToPackage = [13, 14, 15, 16, 18, 19]
-packages.get_package(package_id=16).tiedToPackage = [13, 14, 15, 16, 18, 19]
-packages.get_package(package_id=19).tiedToPackage = [13, 14, 15, 16, 18, 19]
+# Make some manual corrections to the data. Could do this in the CSV file, but serves as a good demo. update_package
+# keeps the table's indexes and summaries up to date with each change.
+for package_id in [3, 18, 36, 38]:
+    packages.update_package(package_id, tiedToTruck=2)
+for package_id in [13, 14, 15, 16, 19]:  # Indirectly tied to truck 2.
+    packages.update_package(package_id, tiedToTruck=2, tiedToPackage=[13, 14, 15, 16, 18, 19])
+for package_id in [6, 25, 28, 32]:
+    packages.update_package(package_id, availability=9 + 5 / 60)
+packages.update_package(9, distances.address_index, street="410 S State St", zip_code=84111,
+                        availability=10 + 20 / 60)  # Time when address is to be fixed.
 
 # Create a route object after providing the distance matrix, packages, and trucks. Then flatten the matrix, and
-# generate a loading/routing solution.
+# generate a loading/routing solution. Like the pruned table, the flattened coordinates are cached on disk.
 route = Route(distances, packages, trucks)
-route.flatten()
+route.flatten(cache_str="distances.embedding")
 route.iterative_solution()
+if report_file:
+    instruments.disable()
+    instruments.write_report(report_file)
 
 # Report generation.
 report = Report(route)
@@ -63,18 +61,17 @@ report = Report(route)
 active = True
 while active:
     print("Press X to exit | R for report | ")
-    if input() == "X":
+    command = input()
+    if command == "X":
         active = False
         break
-    elif input() == "R":
+    elif command == "R":
         print("Enter the hour for the lookup time (24 hour format): ")
         status_time_hour = float(input())
         print("Enter the minute for the lookup time (1-60): ")
         status_time_minute = float(input())
-        report.simulate(status_time_hour + status_time_minute/60)
         report.print_solution()
-        report.out()
-        report.reset()
+        report.out(status_time_hour + status_time_minute/60)
         continue
     else:
         continue
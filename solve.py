@@ -0,0 +1,210 @@
+# =================================================================================================
+# Solve file - headless entry point. Solves one or more instances without prompting, writes each plan and package
+# timeline as JSON, and exits.
+# Run with: python solve.py sample.json [more.json ...]
+#       or: python solve.py --distances distances.csv --packages packages.csv --trucks 2 --output plan.json
+# =================================================================================================
+
+import argparse
+import json
+import math
+import os
+import sys
+
+from analytics import *
+
+# An instance config is a JSON object. Paths are relative to the config file. Only packages is required.
+#   distances       Distance table CSV file. Defaults to distances.csv.
+#   packages        Package CSV file.
+#   cache           Prune cache file, see DistanceTable.prune. Defaults to no cache.
+#   embedding_cache Flattened coordinate cache file, see Route.flatten. Defaults to no cache.
+#   trucks          Number of trucks, or a list of truck objects with an id and optionally capacity, speed,
+#                   depot, start_time and end_time, as on Truck. Defaults to 2.
+#   corrections     List of objects holding a package_id and the package fields to change, by name as on Package.
+#   workers, max_vectors, target_length, local_search
+#                   Passed on to the route, see Route.iterative_solution. Default to 1, 64, null and false.
+#   status_times    Times at which to count the packages in each status. Defaults to none.
+#   output          File to write the result to. Defaults to the config file name with .plan.json in place of .json.
+DEFAULT_CONFIG = {"distances": "distances.csv", "cache": None, "embedding_cache": None, "trucks": 2, "corrections": [],
+                  "workers": 1, "max_vectors": 64, "target_length": None, "local_search": False, "status_times": [],
+                  "output": None}
+
+# Distance tables already loaded by this process, keyed by file, modification time and cache file, so that batches of
+# instances over the same distances only populate and prune them once. Each is held with its source hash as loaded.
+# Adding an address to a table (see DistanceTable.add_address) changes its source hash, so a table one instance has
+# added addresses to is never handed to another.
+loaded_distances = {}
+
+
+# Returns the pruned distance table for a file, loading it only if this process has not already done so, or if the
+# loaded table has since been changed.
+def load_distances(filename, cache=None):
+    key = (os.path.realpath(filename), os.path.getmtime(filename), cache)
+    if key not in loaded_distances or loaded_distances[key][0].source_hash != loaded_distances[key][1]:
+        distances = DistanceTable()
+        distances.populate(filename)
+        distances.prune(cache)
+        loaded_distances[key] = [distances, distances.source_hash]
+    return loaded_distances[key][0]
+
+
+# Builds the fleet from a truck count, or a list of truck objects.
+def build_trucks(spec):
+    if isinstance(spec, int):
+        return [Truck(truck_id) for truck_id in range(1, spec + 1)]
+    trucks = []
+    for item in spec:
+        item = dict(item)
+        truck = Truck(item.pop("id"))
+        for field, value in item.items():
+            if field not in ("capacity", "speed", "depot", "start_time", "end_time"):
+                raise ValueError("Truck has no field " + field)
+            setattr(truck, field, value)
+        trucks.append(truck)
+    return trucks
+
+
+# Replaces infinite times, for packages that are never delivered, with None, which JSON can represent.
+def json_time(value):
+    if math.isinf(value):
+        return None
+    return value
+
+
+# Returns the plan of a solved route, and the timeline of every package, as plain data.
+def plan_result(route, status_times):
+    timeline = Timeline(route.plan, route.packages)
+    segments = []
+    for segment in route.plan:
+        segments.append({"truck": segment.truck.truckId,
+                         "start_time": segment.start_time,
+                         "end_time": json_time(segment.end_time),
+                         "length": segment.length,
+                         "missed_deadlines": segment.missed_deadlines,
+                         "packages": sorted(package.package_id
+                                            for package in segment.package_list.get_package(get_all=True)),
+                         "addresses": segment.address_sequence})
+
+    packages = []
+    for package_id in sorted(timeline.package_timelines):
+        package_timeline = timeline.package_timelines[package_id]
+        packages.append({"id": package_id,
+                         "address": package_timeline.package.address,
+                         "truck": package_timeline.truck_id,
+                         "deadline": package_timeline.package.deadline,
+                         "departure_time": json_time(package_timeline.departure_time),
+                         "delivery_time": json_time(package_timeline.delivery_time),
+                         "missed_deadline": package_timeline.delivery_time > package_timeline.package.deadline})
+
+    return {"route_length": sum(segment.length for segment in route.plan),
+            "missed_deadlines": sum(segment.missed_deadlines for segment in route.plan),
+            "segments": segments,
+            "packages": packages,
+            "status": [{"time": status_time, "counts": timeline.count(status_time)} for status_time in status_times]}
+
+
+# Solves one instance config, with paths relative to base_dir, and returns the result.
+def solve_instance(config, base_dir="."):
+    for key in config:
+        if key not in DEFAULT_CONFIG and key != "packages":
+            raise ValueError("Unknown config key " + key)
+    if "packages" not in config:
+        raise ValueError("Config has no packages file")
+    settings = dict(DEFAULT_CONFIG, **config)
+
+    def path(filename):
+        return None if filename is None else os.path.join(base_dir, filename)
+
+    distances = load_distances(path(settings["distances"]), path(settings["cache"]))
+    packages = PackageTable()
+    packages.populate(path(settings["packages"]))
+    for correction in settings["corrections"]:
+        correction = dict(correction)
+        packages.update_package(correction.pop("package_id"), distances.address_index, **correction)
+
+    route = Route(distances, packages, build_trucks(settings["trucks"]))
+    route.local_search = settings["local_search"]
+    route.flatten(cache_str=path(settings["embedding_cache"]))
+    route.iterative_solution(settings["workers"], settings["max_vectors"], settings["target_length"])
+    return plan_result(route, settings["status_times"])
+
+
+# Solves an instance and writes its result, to stdout if output is "-". Returns the result.
+def run_instance(config, base_dir, output):
+    result = solve_instance(config, base_dir)
+    if output == "-":
+        json.dump(result, sys.stdout, indent=2)
+        print()
+    else:
+        with open(output, "w") as output_file:
+            json.dump(result, output_file, indent=2)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Solve delivery instances without prompting, and write each plan and "
+                                                 "package timeline as JSON.")
+    parser.add_argument("configs", nargs="*", help="Instance config files, see DEFAULT_CONFIG.")
+    parser.add_argument("--distances", help="Distance table CSV file, for an instance given by arguments.")
+    parser.add_argument("--packages", help="Package CSV file, for an instance given by arguments.")
+    parser.add_argument("--cache", help="Prune cache file, for an instance given by arguments.")
+    parser.add_argument("--trucks", type=int, help="Number of trucks, for an instance given by arguments.")
+    parser.add_argument("--corrections", help="JSON file holding a list of corrections, for an instance given by "
+                                              "arguments.")
+    parser.add_argument("--output", default="-",
+                        help="Result file for an instance given by arguments. Defaults to stdout.")
+    parser.add_argument("--workers", type=int, help="Number of worker processes, overriding the configs.")
+    parser.add_argument("--max-vectors", type=int, help="Number of init vectors to try, overriding the configs.")
+    parser.add_argument("--local-search", action="store_true", help="Improve each segment with local search.")
+    parser.add_argument("--report",
+                        help="Write a JSON report of the stage timings and counters of the whole run to this file.")
+    parser.add_argument("--quiet", action="store_true", help="Do not print a summary line for each instance.")
+    args = parser.parse_args()
+
+    # Each instance is a config, the directory its paths are relative to, and its output file.
+    instances = []
+    for config_file in args.configs:
+        with open(config_file) as config_stream:
+            config = json.load(config_stream)
+        output = config.pop("output", None)
+        if output is None:
+            output = os.path.splitext(config_file)[0] + ".plan.json"
+        else:
+            output = os.path.join(os.path.dirname(config_file), output)
+        instances.append([config_file, config, os.path.dirname(config_file), output])
+    if args.packages is not None:
+        config = {"packages": args.packages}
+        for key, value in [["distances", args.distances], ["cache", args.cache], ["trucks", args.trucks]]:
+            if value is not None:
+                config[key] = value
+        if args.corrections is not None:
+            with open(args.corrections) as corrections_stream:
+                config["corrections"] = json.load(corrections_stream)
+        instances.append([args.packages, config, ".", args.output])
+    if len(instances) == 0:
+        parser.error("give at least one config file, or --packages")
+
+    if args.report:
+        instruments.enable()
+
+    failures = 0
+    for name, config, base_dir, output in instances:
+        for key, value in [["workers", args.workers], ["max_vectors", args.max_vectors]]:
+            if value is not None:
+                config[key] = value
+        if args.local_search:
+            config["local_search"] = True
+        try:
+            result = run_instance(config, base_dir, output)
+        except (OSError, KeyError, TypeError, ValueError) as error:
+            print(name + ": " + str(error), file=sys.stderr)
+            failures += 1
+            continue
+        if not args.quiet and output != "-":
+            print(name + ": " + str(round(result["route_length"], 1)) + " miles, " +
+                  str(result["missed_deadlines"]) + " missed deadlines, written to " + output)
+
+    if args.report:
+        instruments.disable()
+        instruments.write_report(args.report)
+    sys.exit(1 if failures > 0 else 0)